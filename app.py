@@ -1,21 +1,52 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 import os
 from dotenv import load_dotenv
 
 from routers import auth_router, facebook_router, google_router, spotify_router
+from services.http_client import startup_http_clients, shutdown_http_clients
+from services.cache_service import startup_cache, shutdown_cache
+from services.fact_store import prune_facts, close_fact_store
+from services.prefetch_service import start_prefetch_scheduler, stop_prefetch_scheduler
+from services.token_store import SESSION_IDLE_TIMEOUT
+from services.resilience import get_breaker_states
+from services.metrics import MetricsMiddleware, render_metrics
+from services.request_timing import is_profiling_admin, get_profile
+from services.logging_service import setup_logging, CorrelationIdMiddleware
+from services.compression import CompressionMiddleware
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Multi-Platform Analytics API", debug=True)
+# Structured, queue-backed logging for everything below
+setup_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Open the pooled upstream HTTP clients and the response cache, prune expired facts and start the report
+    prefetcher on startup, stop and close them on shutdown
+    """
+    await startup_http_clients()
+    await startup_cache()
+    await prune_facts()
+    start_prefetch_scheduler()
+    yield
+    await stop_prefetch_scheduler()
+    await shutdown_cache()
+    await shutdown_http_clients()
+    close_fact_store()
+
+app = FastAPI(title="Multi-Platform Analytics API", debug=True, lifespan=lifespan)
 
 # Add session middleware for token storage
 app.add_middleware(
     SessionMiddleware,
     secret_key=os.getenv("JWT_SECRET", "your_random_secure_string"),
-    max_age=3600  # Session expires after 1 hour
+    max_age=SESSION_IDLE_TIMEOUT  # Session expires after 1 hour idle
 )
 
 # Add CORS middleware
@@ -27,6 +58,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON and NDJSON bodies (brotli or gzip)
+app.add_middleware(CompressionMiddleware)
+
+# Time every request per route for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Tag every request (and its log records) with a correlation ID; added last so it wraps everything else
+app.add_middleware(CorrelationIdMiddleware)
+
 # Include routers for authentication and Facebook services
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(facebook_router, prefix="/facebook", tags=["Facebook Insights"])
@@ -42,6 +82,36 @@ async def root():
     """
     return {"message": "Multi-Platform Analytics API is running. Use /docs for API documentation."}
 
+@app.get("/health")
+async def health():
+    """
+    Upstream health: circuit breaker state per host ("degraded" while any breaker is not closed)
+    """
+    upstreams = get_breaker_states()
+    degraded = any(state["state"] != "closed" for state in upstreams.values())
+    return {"status": "degraded" if degraded else "ok", "upstreams": upstreams}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus metrics: upstream latency and status per API, service call latency, route latency, cache hit ratios
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profiles/{profile_id}")
+async def debug_profile(request: Request, profile_id: str):
+    """
+    Sampled call profile of a request made with profiling on (admin token required).
+    Stacks cover only the profiled request and the tasks it spawned; samples taken while the event loop
+    was idle or running other requests are reported as counts.
+    """
+    if not is_profiling_admin(request):
+        raise HTTPException(status_code=403, detail="Profiling requires the admin token")
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found or expired")
+    return profile
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
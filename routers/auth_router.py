@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Request, HTTPException, status
+from fastapi import APIRouter, Request, HTTPException, Depends, status
 from fastapi.responses import RedirectResponse, JSONResponse
 import os
-from services.token_service import create_google_oauth, save_token_to_session, is_authenticated
+from services.token_service import (
+    has_token,
+    delete_token_from_session,
+    get_refresh_stats
+)
 # from services.facebook_service import get_facebook_auth_url, exchange_facebook_token
 from services.google_service import get_google_auth_url, exchange_google_token
 from services.spotify_service import exchange_spotify_token  # Import Spotify token exchange logic
-router = APIRouter()
+from routers.timing import TimedRoute
+from routers.dependencies import require_admin
+
+router = APIRouter(route_class=TimedRoute)
 
 @router.get("/login")
 async def login_sequence():
@@ -34,8 +41,7 @@ async def spotify_callback(request: Request, code: str = None, error: str = None
         raise HTTPException(status_code=400, detail="No authorization code provided for Spotify")
 
     try:
-        token_info = exchange_spotify_token(request, code)  # Use dedicated service function
-        save_token_to_session(request, token_info, key="spotify_token_info")
+        token_info = await exchange_spotify_token(request, code)  # Use dedicated service function (stores the token)
         return {"message": "Spotify Authentication successful", "authenticated": True}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to get Spotify token: {str(e)}")
@@ -63,11 +69,7 @@ async def google_callback(request: Request, code: str = None, error: str = None)
     if not code:
         raise HTTPException(status_code=400, detail="No authorization code provided for Google")
 
-    flow = create_google_oauth()
-    flow.fetch_token(code=code)
-
-    token_info = flow.credentials.to_json()
-    save_token_to_session(request, token_info)
+    await exchange_google_token(request, code)
 
     return {"message": "Google Authentication successful", "authenticated": True}
 
@@ -76,9 +78,9 @@ async def auth_status(request: Request):
     """
     Check authentication status for Spotify, Facebook & Google
     """
-    spotify_authenticated = is_authenticated(request)
-    facebook_authenticated = "token_info" in request.session  # Checking session for Facebook tokens
-    google_authenticated = "google_token_info" in request.session  # Checking session for Google tokens
+    spotify_authenticated = await has_token(request, "spotify_token_info")
+    facebook_authenticated = await has_token(request, "facebook_token_info")  # Checking session for Facebook tokens
+    google_authenticated = await has_token(request, "google_token_info")  # Checking session for Google tokens
 
     return {
         "spotify_authenticated": spotify_authenticated,
@@ -86,12 +88,19 @@ async def auth_status(request: Request):
         "google_authenticated": google_authenticated
     }
 
+@router.get("/refresh/stats")
+async def refresh_stats(_: None = Depends(require_admin)):
+    """
+    Report how many provider token refreshes were performed and how many concurrent ones were coalesced
+    """
+    return get_refresh_stats()
+
 @router.get("/logout")
 async def logout(request: Request):
     """
     Logs out from Spotify, Facebook & Google by clearing session tokens
     """
-    request.session.pop("token_info", None)  # Spotify
-    request.session.pop("facebook_token_info", None)  # Facebook
-    request.session.pop("google_token_info", None)  # Google
+    await delete_token_from_session(request, "spotify_token_info")  # Spotify
+    await delete_token_from_session(request, "facebook_token_info")  # Facebook
+    await delete_token_from_session(request, "google_token_info")  # Google
     return {"message": "Logged out successfully from all services"}
@@ -0,0 +1,7 @@
+from fastapi import Request, HTTPException
+from services.request_timing import is_profiling_admin
+
+def require_admin(request: Request):
+    """Dependency restricting operational endpoints to callers sending the admin token"""
+    if not is_profiling_admin(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Request, Depends, HTTPException, status
-from services.facebook_service import get_facebook_auth_url, exchange_facebook_token, get_page_insights
+from fastapi import APIRouter, Request, Depends, HTTPException, Query, status
+from services.facebook_service import get_facebook_auth_url, exchange_facebook_token, get_page_insights, get_batch_page_insights
 from services.token_service import is_authenticated
+from routers.timing import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.get("/login/facebook")
 async def login_facebook():
@@ -19,10 +20,25 @@ async def facebook_callback(request: Request, code: str = None, error: str = Non
     if not code:
         raise HTTPException(status_code=400, detail="No authorization code provided")
 
-    token_info = exchange_facebook_token(request, code)
+    token_info = await exchange_facebook_token(request, code)
     return {"message": "Facebook Authentication successful", "authenticated": True}
 
 @router.get("/page-insights/{page_id}")
 async def fetch_page_insights(request: Request, page_id: str, _: bool = Depends(is_authenticated)):
     """Retrieve insights for a Facebook Page"""
-    return get_page_insights(request, page_id)
+    return await get_page_insights(request, page_id)
+
+@router.get("/page-insights")
+async def fetch_batch_page_insights(
+    request: Request,
+    page_ids: str = Query(..., description="Comma-separated Facebook Page IDs"),
+    metrics: str = Query(None, description="Comma-separated insight metrics (defaults to the standard page metrics)"),
+    period: str = Query("day", description="Aggregation period: day, week or days_28"),
+    since: str = Query(None, description="Start date in YYYY-MM-DD format"),
+    until: str = Query(None, description="End date in YYYY-MM-DD format (defaults to today when since is given)"),
+    _: bool = Depends(is_authenticated)
+):
+    """Retrieve insights for many Facebook Pages at once, normalized per page and metric"""
+    ids = [page_id.strip() for page_id in page_ids.split(",") if page_id.strip()]
+    metric_names = [metric.strip() for metric in metrics.split(",") if metric.strip()] if metrics else None
+    return await get_batch_page_insights(request, ids, metric_names, period, since, until)
@@ -1,12 +1,23 @@
+import logging
+import hashlib
 from fastapi import APIRouter, Request, HTTPException, Query, Depends
 from datetime import datetime, timedelta
-from services.token_service import is_authenticated
+from services.token_service import is_authenticated, delete_token_from_session
+from services.cache_service import cache_stats
+from services.ga4_frame import parse_aggregation
+from services.prefetch_service import get_prefetch_stats
+from services.quota_scheduler import get_quota_stats
+from routers.dependencies import require_admin
+from routers.responses import ndjson_response, conditional_json_response
+from services.json_codec import dumps_json
+from routers.timing import TimedRoute
 from services.google_service import (
     get_google_auth_url,
     exchange_google_token,
     get_ga4_property,
     get_combined_ga4_analytics,
     get_combined_ga4_analytics_auto,
+    stream_combined_ga4_analytics,
     get_combined_youtube_analytics_auto,
     get_partner_channels,
     get_owner_channel,
@@ -14,7 +25,21 @@ from services.google_service import (
     refresh_google_token_if_needed
 )
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+logger = logging.getLogger(__name__)
+
+def youtube_analytics_response(request: Request, report: dict):
+    """
+    Conditional JSON response whose ETag ignores report_status (timings and cache state change every call).
+    Each report is encoded once; the ETag hashes the encoded reports as the body is assembled.
+    """
+    fields, digest = [], hashlib.sha256()
+    for key, value in report.items():
+        field = dumps_json(key) + b":" + dumps_json(value)
+        fields.append(field)
+        if key != "report_status":
+            digest.update(field)
+    return conditional_json_response(request, b"{" + b",".join(fields) + b"}", etag_content=digest.digest())
 
 @router.get("/auth/login/google")
 async def login_google():
@@ -32,7 +57,7 @@ async def google_callback(request: Request, code: str = None, error: str = None)
         raise HTTPException(status_code=400, detail="No authorization code provided for Google")
 
     try:
-        token_info = exchange_google_token(request, code)
+        token_info = await exchange_google_token(request, code)
         # Return success response with token information (access token hidden for security)
         return {
             "message": "Google Authentication successful", 
@@ -48,8 +73,7 @@ async def auth_status(request: Request):
     """Check authentication status for Google services"""
     try:
         # This will attempt to refresh token if needed
-        token_info = refresh_google_token_if_needed(request)
-        print(token_info, "token_info")
+        token_info = await refresh_google_token_if_needed(request)
         return {
             "authenticated": True,
             "token_type": token_info.get("token_type"),
@@ -63,20 +87,30 @@ async def auth_status(request: Request):
 
 ### 📌 FETCH PARTNER CHANNELS ###
 @router.get("/google/youtube/partner-channels")
-async def fetch_partner_channels(request: Request, _: bool = Depends(is_authenticated)):
+async def fetch_partner_channels(
+    request: Request,
+    _: bool = Depends(is_authenticated),
+    refresh_discovery: bool = Query(False, description="Re-discover IDs instead of using the cached lookup")
+):
     """Retrieve YouTube partner channels where user has access"""
     try:
-        return get_partner_channels(request)
+        return conditional_json_response(request, await get_partner_channels(request, refresh_discovery=refresh_discovery, raw=True))
     except Exception as e:
+        logger.exception("Google analytics request failed")
         return {"success": False, "error": str(e)}
     
 ### FETCH OWNED YOUTUBE CHANNEL ###    
 @router.get("/google/youtube/owner-channel")
-async def fetch_owner_channel(request: Request, _: bool = Depends(is_authenticated)):
+async def fetch_owner_channel(
+    request: Request,
+    _: bool = Depends(is_authenticated),
+    refresh_discovery: bool = Query(False, description="Re-discover IDs instead of using the cached lookup")
+):
     """Retrieve the authenticated user's YouTube channel details"""
     try:
-        return get_owner_channel(request)
+        return conditional_json_response(request, await get_owner_channel(request, refresh_discovery=refresh_discovery, raw=True))
     except Exception as e:
+        logger.exception("Google analytics request failed")
         return {"success": False, "error": str(e)}
 
 ### 📊 FETCH COMBINED YOUTUBE ANALYTICS ###
@@ -85,12 +119,19 @@ async def fetch_combined_analytics(
     request: Request,
     content_owner_id: str = Query(..., description="Content Owner ID"),
     start_date: str = Query("2024-01-01", description="Start date in YYYY-MM-DD format"),
-    end_date: str = Query("2024-04-01", description="End date in YYYY-MM-DD format")
+    end_date: str = Query("2024-04-01", description="End date in YYYY-MM-DD format"),
+    bypass_cache: bool = Query(False, description="Skip the response cache for this request"),
+    invalidate_cache: bool = Query(False, description="Drop the cached response and fetch fresh data"),
+    chunk_by_month: bool = Query(False, description="Split long ranges into month chunks fetched in parallel and merged")
 ):
     """Retrieve combined monetization, views, engagement, and audience insights"""
     try:
-        return get_combined_youtube_analytics(request, content_owner_id, start_date, end_date)
+        return youtube_analytics_response(request, await get_combined_youtube_analytics(
+            request, content_owner_id, start_date, end_date,
+            bypass_cache=bypass_cache, invalidate_cache=invalidate_cache, chunk_by_month=chunk_by_month
+        ))
     except Exception as e:
+        logger.exception("Google analytics request failed")
         return {"success": False, "error": str(e)}
     
 
@@ -99,20 +140,34 @@ async def fetch_combined_analytics(
 async def fetch_combined_youtube_analytics_auto(
     request: Request,
     start_date: str = Query("2024-01-01", description="Start date in YYYY-MM-DD format"),
-    end_date: str = Query("2024-04-01", description="End date in YYYY-MM-DD format")
+    end_date: str = Query("2024-04-01", description="End date in YYYY-MM-DD format"),
+    bypass_cache: bool = Query(False, description="Skip the response cache for this request"),
+    invalidate_cache: bool = Query(False, description="Drop the cached response and fetch fresh data"),
+    refresh_discovery: bool = Query(False, description="Re-discover IDs instead of using the cached lookup"),
+    chunk_by_month: bool = Query(False, description="Split long ranges into month chunks fetched in parallel and merged")
 ):
     """Automatically retrieve YouTube analytics without requiring Content Owner ID"""
     try:
-        return get_combined_youtube_analytics_auto(request, start_date, end_date)
+        return youtube_analytics_response(request, await get_combined_youtube_analytics_auto(
+            request, start_date, end_date,
+            bypass_cache=bypass_cache, invalidate_cache=invalidate_cache,
+            refresh_discovery=refresh_discovery, chunk_by_month=chunk_by_month
+        ))
     except Exception as e:
+        logger.exception("Google analytics request failed")
         return {"success": False, "error": str(e)}
 
 @router.get("/google/ga4/property")
-async def fetch_ga4_property(request: Request, _: bool = Depends(is_authenticated)):
+async def fetch_ga4_property(
+    request: Request,
+    _: bool = Depends(is_authenticated),
+    refresh_discovery: bool = Query(False, description="Re-discover IDs instead of using the cached lookup")
+):
     """Retrieve the authenticated user's GA4 Property ID"""
     try:
-        return get_ga4_property(request)
+        return await get_ga4_property(request, refresh_discovery=refresh_discovery)
     except Exception as e:
+        logger.exception("Google analytics request failed")
         return {"success": False, "error": str(e)}
 
 @router.get("/google/ga4/analytics")
@@ -121,12 +176,33 @@ async def fetch_combined_ga4_analytics(
     property_id: str = Query(..., description="GA4 Property ID"),
     start_date: str = Query("2024-01-01", description="Start date in YYYY-MM-DD format"),
     end_date: str = Query("2024-04-01", description="End date in YYYY-MM-DD format"),
-    has_admin_access: bool = Query(False, description="Indicates whether the user has Admin access")
+    has_admin_access: bool = Query(False, description="Indicates whether the user has Admin access"),
+    bypass_cache: bool = Query(False, description="Skip the response cache for this request"),
+    invalidate_cache: bool = Query(False, description="Drop the cached response and fetch fresh data"),
+    group_by: str = Query(None, description="Comma-separated dimensions to aggregate by (e.g. country,deviceCategory)"),
+    metric_agg: str = Query(None, description="Per-metric aggregation overrides, e.g. activeUsers:max,bounceRate:avg (sum, avg, max, weighted); required for user counts such as activeUsers and newUsers"),
+    top_n: int = Query(None, description="Keep the top N groups and fold the rest into an \"(other)\" bucket"),
+    top_by: str = Query(None, description="Metric used to rank groups for top_n (defaults to the first metric)"),
+    resample: str = Query(None, description="Resample the date dimension: day, week or month"),
+    chunk_by_month: bool = Query(False, description="Split long ranges into month chunks fetched in parallel and merged"),
+    strict_fields: bool = Query(False, description="Reject the request instead of dropping fields the property does not support"),
+    stream: bool = Query(False, description="Stream rows as NDJSON while GA4 pages arrive (ignored when aggregating)")
 ):
     """Retrieve GA4 analytics with available metrics based on user permissions"""
     try:
-        return get_combined_ga4_analytics(request, property_id, start_date, end_date, has_admin_access)
+        aggregation = parse_aggregation(group_by, metric_agg, top_n, top_by, resample)
+        if stream and not aggregation:
+            return await ndjson_response(
+                stream_combined_ga4_analytics(request, property_id, start_date, end_date, has_admin_access, strict_fields)
+            )
+        return conditional_json_response(request, await get_combined_ga4_analytics(
+            request, property_id, start_date, end_date, has_admin_access,
+            bypass_cache=bypass_cache, invalidate_cache=invalidate_cache,
+            aggregation=aggregation, chunk_by_month=chunk_by_month,
+            strict_fields=strict_fields, raw=True
+        ))
     except Exception as e:
+        logger.exception("Google analytics request failed")
         return {"success": False, "error": str(e)}
 
 
@@ -136,18 +212,51 @@ async def fetch_combined_ga4_analytics_auto(
     request: Request,
     start_date: str = Query("2024-01-01", description="Start date in YYYY-MM-DD format"),
     end_date: str = Query("2024-04-01", description="End date in YYYY-MM-DD format"),
-    has_admin_access: bool = Query(False, description="Indicates whether the user has Admin access")
+    has_admin_access: bool = Query(False, description="Indicates whether the user has Admin access"),
+    bypass_cache: bool = Query(False, description="Skip the response cache for this request"),
+    invalidate_cache: bool = Query(False, description="Drop the cached response and fetch fresh data"),
+    refresh_discovery: bool = Query(False, description="Re-discover IDs instead of using the cached lookup"),
+    group_by: str = Query(None, description="Comma-separated dimensions to aggregate by (e.g. country,deviceCategory)"),
+    metric_agg: str = Query(None, description="Per-metric aggregation overrides, e.g. activeUsers:max,bounceRate:avg (sum, avg, max, weighted); required for user counts such as activeUsers and newUsers"),
+    top_n: int = Query(None, description="Keep the top N groups and fold the rest into an \"(other)\" bucket"),
+    top_by: str = Query(None, description="Metric used to rank groups for top_n (defaults to the first metric)"),
+    resample: str = Query(None, description="Resample the date dimension: day, week or month"),
+    chunk_by_month: bool = Query(False, description="Split long ranges into month chunks fetched in parallel and merged"),
+    strict_fields: bool = Query(False, description="Reject the request instead of dropping fields the property does not support")
 ):
     """Automatically retrieve GA4 analytics without requiring Property ID"""
     try:
-        return get_combined_ga4_analytics_auto(request, start_date, end_date, has_admin_access)
+        aggregation = parse_aggregation(group_by, metric_agg, top_n, top_by, resample)
+        return conditional_json_response(request, await get_combined_ga4_analytics_auto(
+            request, start_date, end_date, has_admin_access,
+            bypass_cache=bypass_cache, invalidate_cache=invalidate_cache,
+            refresh_discovery=refresh_discovery, aggregation=aggregation,
+            chunk_by_month=chunk_by_month, strict_fields=strict_fields, raw=True
+        ))
     except Exception as e:
+        logger.exception("Google analytics request failed")
         return {"success": False, "error": str(e)}
 
+### 🗄️ RESPONSE CACHE STATS ###
+@router.get("/google/cache/stats")
+async def fetch_cache_stats(_: None = Depends(require_admin)):
+    """Hit/miss counters for the GA4 and YouTube report caches (admin token required)"""
+    return cache_stats()
+
+@router.get("/google/prefetch/stats")
+async def fetch_prefetch_stats(_: None = Depends(require_admin)):
+    """Counters for the background report warm-up (admin token required)"""
+    return get_prefetch_stats()
+
+@router.get("/google/quota/stats")
+async def fetch_quota_stats(_: None = Depends(require_admin)):
+    """Quota scheduler state: limiter queues, 429 backoffs and the latest GA4 property quota (admin token required)"""
+    return get_quota_stats()
+
 @router.get("/auth/logout")
 async def logout(request: Request):
     """
     Logs out from Google services by clearing session tokens
     """
-    request.session.pop("google_token_info", None)
+    await delete_token_from_session(request, "google_token_info")
     return {"message": "Logged out successfully from Google services"}
\ No newline at end of file
@@ -0,0 +1,54 @@
+import re
+import hashlib
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from services.cache_service import make_cache_key
+from services.token_service import SESSION_ID_KEY
+
+async def ndjson_response(lines):
+    """Wrap an async line generator in a streaming NDJSON response, surfacing errors before the first byte"""
+    try:
+        first_line = await lines.__anext__()
+    except StopAsyncIteration:
+        first_line = None
+
+    async def body():
+        if first_line is None:
+            return
+        yield first_line
+        async for line in lines:
+            yield line
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+# Query flags that change how a response is produced, not what it contains
+ETAG_IGNORED_PARAMS = {"bypass_cache", "invalidate_cache", "refresh_discovery"}
+
+def compute_etag(request: Request, content: bytes):
+    """
+    Strong ETag from a cache key for the request (session, path and query) and a hash of the content.
+    The session scopes the validator to one user, like the report caches behind it.
+    """
+    params = sorted((key, value) for key, value in request.query_params.multi_items() if key not in ETAG_IGNORED_PARAMS)
+    session_id = request.scope.get("session", {}).get(SESSION_ID_KEY)
+    cache_key = make_cache_key("etag", user=session_id, path=request.url.path, params=params)
+    return '"' + hashlib.sha256(cache_key.encode() + b"\n" + content).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: str, etag: str):
+    """If-None-Match comparison (weak, per RFC 9110), ignoring the encoding suffix added by CompressionMiddleware"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [re.sub(r'-(gzip|br)"$', '"', tag.strip().removeprefix("W/")) for tag in if_none_match.split(",")]
+    return etag in candidates
+
+def conditional_json_response(request: Request, payload: bytes, etag_content: bytes = None):
+    """
+    Send already-encoded JSON as-is (skipping FastAPI's jsonable_encoder) with an ETag, or an empty 304 when the client's If-None-Match already has this version.
+    etag_content hashes a stable view of the payload when the payload itself carries volatile fields.
+    """
+    etag = compute_etag(request, payload if etag_content is None else etag_content)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}  # Clients must revalidate, which is cheap
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
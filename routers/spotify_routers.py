@@ -1,7 +1,19 @@
-from fastapi import APIRouter, Request, HTTPException
-from services.spotify_service import get_spotify_auth_url, exchange_spotify_token, get_user_artists, refresh_spotify_token_if_needed
+from fastapi import APIRouter, Request, HTTPException, Query
+from services.spotify_service import (
+    get_spotify_auth_url,
+    exchange_spotify_token,
+    get_user_artists,
+    stream_user_artists,
+    analyze_music_taste,
+    analyze_playlist,
+    SPOTIFY_TIME_RANGES,
+    refresh_spotify_token_if_needed
+)
+from models.spotify_models import MusicTasteAnalysis, PlaylistAnalysis
+from routers.responses import ndjson_response
+from routers.timing import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.get("/spotify/auth")
 def spotify_auth():
@@ -9,16 +21,16 @@ def spotify_auth():
     return {"auth_url": get_spotify_auth_url()}
 
 @router.get("/spotify/callback")
-def spotify_callback(request: Request, code: str):
+async def spotify_callback(request: Request, code: str):
     """Exchange authorization code for access token"""
-    token_info = exchange_spotify_token(request, code)
+    token_info = await exchange_spotify_token(request, code)
     return {"message": "Authentication successful", "token_info": token_info}
 
 @router.get("/spotify/auth/status")
 async def spotify_auth_status(request: Request):
     """Check authentication status for Spotify services"""
     try:
-        token_info = refresh_spotify_token_if_needed(request)  # Refresh if needed
+        token_info = await refresh_spotify_token_if_needed(request)  # Refresh if needed
         return {
             "authenticated": True,
             "token_type": token_info.get("token_type"),
@@ -30,9 +42,33 @@ async def spotify_auth_status(request: Request):
     
 
 @router.get("/spotify/artists")
-def spotify_followed_artists(request: Request):
+async def spotify_followed_artists(
+    request: Request,
+    stream: bool = Query(False, description="Stream artists as NDJSON while pages arrive"),
+    bypass_cache: bool = Query(False, description="Skip the cached artist list for this request"),
+    invalidate_cache: bool = Query(False, description="Drop the cached artist list and walk the cursor chain again")
+):
     """Fetch followed artists for authenticated user"""
-    artists = get_user_artists(request)
-    if not artists:
-        raise HTTPException(status_code=400, detail="Failed to retrieve artists")
+    if stream:
+        return await ndjson_response(stream_user_artists(request, bypass_cache=bypass_cache, invalidate_cache=invalidate_cache))
+    artists = await get_user_artists(request, bypass_cache=bypass_cache, invalidate_cache=invalidate_cache)
     return {"followed_artists": artists}
+
+@router.get("/spotify/analyze/taste", response_model=MusicTasteAnalysis)
+async def spotify_music_taste(
+    request: Request,
+    time_range: str = Query("medium_term", description="Top items window: short_term, medium_term or long_term")
+):
+    """Analyze the user's music taste from their top tracks and artists"""
+    if time_range not in SPOTIFY_TIME_RANGES:
+        raise HTTPException(status_code=400, detail=f"time_range must be one of {sorted(SPOTIFY_TIME_RANGES)}")
+    return await analyze_music_taste(request, time_range)
+
+@router.get("/spotify/analyze/playlist/{playlist_id}", response_model=PlaylistAnalysis)
+async def spotify_playlist_analysis(
+    request: Request,
+    playlist_id: str,
+    bypass_cache: bool = Query(False, description="Re-analyze even if this playlist snapshot was analyzed before")
+):
+    """Analyze a playlist's duration, average audio features, top artists and mood"""
+    return await analyze_playlist(request, playlist_id, bypass_cache=bypass_cache)
@@ -0,0 +1,62 @@
+import time
+import asyncio
+import functools
+from fastapi.routing import APIRoute
+from services.request_timing import start_request_timing, record_phase, server_timing_header, start_profiler, store_profile
+
+def timed_endpoint(endpoint):
+    """Wrap a route endpoint so its run time is recorded as the "handler" phase (the signature is preserved)"""
+    if getattr(endpoint, "_timed", False):  # include_router rebuilds routes from the already wrapped endpoint
+        return endpoint
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                record_phase("handler", time.perf_counter() - started)
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                record_phase("handler", time.perf_counter() - started)
+    timed._timed = True
+    return timed
+
+class TimedRoute(APIRoute):
+    """
+    Route adding a Server-Timing header broken down by phase: upstream calls and service functions recorded
+    during the request, the endpoint itself, and "serialize" (dependencies, validation and response encoding).
+    Admins can request a sampled stack profile, returned by ID in the X-Profile-Id header.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            phases = start_request_timing()
+            sampler = start_profiler(request)
+            started = time.perf_counter()
+            try:
+                response = await handler(request)
+            finally:
+                if sampler is not None:
+                    await sampler.stop()
+            total = time.perf_counter() - started
+
+            handler_seconds = phases.get("handler", [0.0, 0])[0]
+            record_phase("serialize", max(0.0, total - handler_seconds))
+            record_phase("total", total)
+            response.headers["Server-Timing"] = server_timing_header(phases)
+            if sampler is not None:
+                response.headers["X-Profile-Id"] = store_profile(sampler, request, phases, total)
+            return response
+
+        return timed_handler
@@ -1,12 +1,12 @@
 # Export essential services related to Spotify user insights and Facebook authentication
 from .token_service import (
-    create_google_oauth,
     get_token_from_session, 
     save_token_to_session,
     # get_refreshed_token,
     # is_token_expired,
     is_authenticated
 )
+from .oauth_providers import get_oauth_provider
 from .spotify_service import (
     get_spotify_auth_url,
     get_user_artists,
@@ -21,12 +21,14 @@ from .facebook_service import (
 # Explicit module exports
 __all__ = [
     # Token Service
-    "create_google_oauth",
     "get_token_from_session",
     "save_token_to_session",
     # "get_refreshed_token",
     # "is_token_expired",
     "is_authenticated",
+
+    # OAuth provider registry
+    "get_oauth_provider",
     
     # Spotify Service (User Insights Only)
     "get_spotify_auth_url",
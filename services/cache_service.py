@@ -0,0 +1,224 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from datetime import date, datetime, timedelta
+from cachetools import LRUCache
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from services.resilience import UpstreamUnavailable
+from services.json_codec import dumps_json, loads_json
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "analytics:")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # In-process LRU size, in payload bytes
+CACHE_TTL_HISTORICAL = int(os.getenv("CACHE_TTL_HISTORICAL", "86400"))  # Ranges that ended before today
+CACHE_TTL_RECENT = int(os.getenv("CACHE_TTL_RECENT", "300"))  # Ranges that include today
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", str(6 * 3600)))  # Expired entries kept to serve while an upstream is down
+
+# In-process fallback used when Redis is not configured or unreachable: key -> (expires_at, payload),
+# bounded by the total payload size since a single report can be several megabytes
+_local_cache = LRUCache(maxsize=CACHE_MAX_BYTES, getsizeof=lambda entry: len(entry[1]))
+_redis = None
+_redis_enabled = bool(REDIS_URL)
+_stats = {}
+
+def _count(namespace: str, field: str):
+    """Increment a per-namespace cache counter"""
+    counters = _stats.setdefault(namespace, {"hits": 0, "misses": 0, "sets": 0, "invalidations": 0, "errors": 0, "stale": 0})
+    counters[field] += 1
+
+def _namespace_of(key: str):
+    return key[len(CACHE_PREFIX):].split(":", 1)[0]
+
+def resolve_date(value: str):
+    """Resolve a GA4-style date (YYYY-MM-DD, today, yesterday, NdaysAgo) to a date"""
+    today = date.today()
+    if value == "today":
+        return today
+    if value == "yesterday":
+        return today - timedelta(days=1)
+    match = re.fullmatch(r"(\d+)daysAgo", value or "")
+    if match:
+        return today - timedelta(days=int(match.group(1)))
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def normalize_date(value: str):
+    """Return the ISO form of a date so relative and absolute spellings share cache entries"""
+    try:
+        return resolve_date(value).isoformat()
+    except (TypeError, ValueError):
+        return value
+
+def ttl_for_date_range(start_date: str, end_date: str):
+    """Long TTL for fully-closed historical ranges, short TTL when the range reaches today"""
+    try:
+        end = resolve_date(end_date)
+    except (TypeError, ValueError):
+        return CACHE_TTL_RECENT
+    return CACHE_TTL_HISTORICAL if end < date.today() else CACHE_TTL_RECENT
+
+def make_cache_key(namespace: str, **parts):
+    """Build a stable cache key from a namespace and the parameters that identify a result"""
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{CACHE_PREFIX}{namespace}:{digest}"
+
+def _get_redis():
+    global _redis
+    if _redis_enabled and _redis is None:
+        _redis = aioredis.from_url(REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    return _redis
+
+async def cache_get_bytes(key: str, allow_stale: bool = False):
+    """
+    Return the cached JSON payload (bytes) for a key, or None on a miss.
+    allow_stale also returns entries past their TTL that are still inside the CACHE_STALE_TTL window.
+    """
+    namespace = _namespace_of(key)
+    entry = None
+    client = _get_redis()
+    if client is not None:
+        try:
+            stored = await client.get(key)
+            if stored is not None:
+                # Redis values are "<expires_at>\n<json>" so stale copies can outlive their TTL
+                expires_at, _, payload = stored.partition(b"\n")
+                entry = (float(expires_at), payload)
+        except RedisError:
+            _count(namespace, "errors")
+            client = None
+    if client is None:
+        entry = _local_cache.get(key)
+        if entry is not None and entry[0] + CACHE_STALE_TTL <= time.time():
+            _local_cache.pop(key, None)
+            entry = None
+
+    if entry is None or (entry[0] <= time.time() and not allow_stale):
+        _count(namespace, "misses")
+        return None
+    _count(namespace, "hits" if entry[0] > time.time() else "stale")
+    return entry[1]
+
+async def cache_get(key: str, allow_stale: bool = False):
+    """Return the cached value for a key, or None on a miss"""
+    payload = await cache_get_bytes(key, allow_stale)
+    return None if payload is None else loads_json(payload)
+
+async def cache_set_bytes(key: str, payload: bytes, ttl: int):
+    """Store an already-encoded JSON payload under a key for ttl seconds"""
+    namespace = _namespace_of(key)
+    expires_at = time.time() + ttl
+    _count(namespace, "sets")
+    client = _get_redis()
+    if client is not None:
+        try:
+            await client.set(key, b"%.3f\n%s" % (expires_at, payload), ex=ttl + CACHE_STALE_TTL)
+            return
+        except RedisError:
+            _count(namespace, "errors")
+    if len(payload) <= CACHE_MAX_BYTES:
+        _local_cache[key] = (expires_at, payload)
+
+async def cache_set(key: str, value, ttl: int):
+    """Store a JSON-serializable value under a key for ttl seconds"""
+    await cache_set_bytes(key, dumps_json(value), ttl)
+
+async def cache_delete(key: str):
+    """Invalidate a cached entry"""
+    _count(_namespace_of(key), "invalidations")
+    _local_cache.pop(key, None)
+    client = _get_redis()
+    if client is not None:
+        try:
+            await client.delete(key)
+        except RedisError:
+            _count(_namespace_of(key), "errors")
+
+async def cached_call(key: str, ttl: int, fetch, bypass_cache: bool = False, invalidate_cache: bool = False):
+    """
+    Return the cached value for key, or await fetch() and cache its result.
+    bypass_cache skips the cache entirely; invalidate_cache drops the entry and refetches.
+    While the upstream is unavailable an expired (stale) entry is served instead of failing.
+    """
+    if bypass_cache:
+        return await fetch()
+    if invalidate_cache:
+        await cache_delete(key)
+    else:
+        cached = await cache_get(key)
+        if cached is not None:
+            return cached
+
+    try:
+        value = await fetch()
+    except UpstreamUnavailable:
+        stale = None if invalidate_cache else await cache_get(key, allow_stale=True)
+        if stale is None:
+            raise
+        return stale
+    await cache_set(key, value, ttl)
+    return value
+
+async def cached_call_bytes(key: str, ttl: int, fetch, bypass_cache: bool = False, invalidate_cache: bool = False):
+    """
+    cached_call for JSON payloads kept as bytes: fetch() returns encoded JSON (e.g. an upstream body), which is
+    cached and returned as-is so passthrough endpoints never decode and re-encode it
+    """
+    if bypass_cache:
+        return await fetch()
+    if invalidate_cache:
+        await cache_delete(key)
+    else:
+        cached = await cache_get_bytes(key)
+        if cached is not None:
+            return cached
+
+    try:
+        payload = await fetch()
+    except UpstreamUnavailable:
+        stale = None if invalidate_cache else await cache_get_bytes(key, allow_stale=True)
+        if stale is None:
+            raise
+        return stale
+    await cache_set_bytes(key, payload, ttl)
+    return payload
+
+def cache_stats():
+    """Hit/miss counters per cache namespace"""
+    namespaces = {}
+    for namespace, counters in _stats.items():
+        lookups = counters["hits"] + counters["misses"]
+        namespaces[namespace] = {**counters, "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else None}
+    return {
+        "backend": "redis" if _redis_enabled else "memory",
+        "local_entries": len(_local_cache),
+        "local_bytes": _local_cache.currsize,
+        "namespaces": namespaces
+    }
+
+async def startup_cache():
+    """Check that Redis is reachable, falling back to the in-process LRU otherwise"""
+    global _redis, _redis_enabled
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        await client.ping()
+    except RedisError as e:
+        logger.warning("Redis unavailable, using in-process cache: %s", e)
+        await client.aclose()
+        _redis = None
+        _redis_enabled = False
+
+async def shutdown_cache():
+    """Close the Redis connection pool"""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -0,0 +1,129 @@
+import os
+import re
+import zlib
+from dotenv import load_dotenv
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is used when brotli is not installed
+    brotli = None
+
+load_dotenv()
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # Smaller bodies are sent as-is
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))  # Higher levels are too slow per request
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+def accepted_encodings(accept_encoding: str):
+    """Encodings the client accepts (q=0 excluded)"""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        match = re.search(r"q=([0-9.]+)", params)
+        if name and not (match and float(match.group(1)) == 0):
+            accepted.add(name.strip().lower())
+    return accepted
+
+def choose_encoding(accept_encoding: str):
+    """Prefer brotli, then gzip; None when the client accepts neither"""
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+def add_vary(headers: list):
+    """Response headers with Accept-Encoding added to Vary (kept once, alongside any existing Vary values)"""
+    new_headers, vary = [], []
+    for key, value in headers:
+        if key.lower() == b"vary":
+            vary.extend(item.strip() for item in value.split(b",") if item.strip())
+        else:
+            new_headers.append((key, value))
+    if not any(item.lower() in (b"accept-encoding", b"*") for item in vary):
+        vary.append(b"Accept-Encoding")
+    return new_headers + [(b"vary", b", ".join(vary))]
+
+class StreamCompressor:
+    """Incremental gzip or brotli compressor; every chunk is flushed so streamed rows are not held back"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool):
+        if self.encoding == "br":
+            output = self._compressor.process(data)
+            return output + (self._compressor.finish() if final else self._compressor.flush())
+        output = self._compressor.compress(data)
+        return output + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing JSON and text responses with brotli or gzip (per Accept-Encoding).
+    Small bodies, already-encoded responses and 304s pass through; strong ETags get an encoding suffix
+    so each representation keeps a distinct validator. Every response that could have been compressed
+    (and every 304) carries Vary: Accept-Encoding, whether or not this one was.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_compressed(message):
+            if message["type"] == "http.response.start":
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if state["compressor"] is None:
+                start = state["start"]
+                response_headers = {key.lower(): value for key, value in start.get("headers", [])}
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                compressible = content_type.startswith(COMPRESSIBLE_TYPES)
+                if (encoding is None or b"content-encoding" in response_headers or start["status"] in (204, 304)
+                        or not compressible or (not more_body and len(body) < COMPRESSION_MIN_SIZE)):
+                    state["passthrough"] = True
+                    if b"content-encoding" not in response_headers and (compressible or start["status"] == 304):
+                        start = {**start, "headers": add_vary(start.get("headers", []))}
+                    await send(start)
+                    await send(message)
+                    return
+
+                state["compressor"] = StreamCompressor(encoding)
+                body = state["compressor"].compress(body, final=not more_body)
+                new_headers = []
+                for key, value in start.get("headers", []):
+                    name = key.lower()
+                    if name == b"content-length":
+                        continue
+                    if name == b"etag" and value.endswith(b'"') and not value.startswith(b"W/"):
+                        value = value[:-1] + b"-" + encoding.encode() + b'"'
+                    new_headers.append((key, value))
+                new_headers.append((b"content-encoding", encoding.encode()))
+                if not more_body:
+                    new_headers.append((b"content-length", str(len(body)).encode()))
+                await send({**start, "headers": add_vary(new_headers)})
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+
+            await send({"type": "http.response.body", "body": state["compressor"].compress(body, final=not more_body),
+                        "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,46 +1,170 @@
-import requests
 import os
+import json
+import asyncio
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, parse_qsl, urlencode
 from fastapi import Request, HTTPException
 from services.token_service import save_token_to_session, get_token_from_session
+from services.http_client import http_get, http_post
+from services.oauth_providers import get_oauth_provider
+from services.metrics import instrumented
 from dotenv import load_dotenv
 load_dotenv()
-FACEBOOK_CLIENT_ID = os.getenv("FACEBOOK_APP_ID")
-FACEBOOK_CLIENT_SECRET = os.getenv("FACEBOOK_APP_SECRET")
-REDIRECT_URI = "https://ba9a-58-146-101-17.ngrok-free.app/auth/callback/facebook"
 
-print(REDIRECT_URI, FACEBOOK_CLIENT_ID, FACEBOOK_CLIENT_SECRET)
+FACEBOOK_TOKEN_KEY = "facebook_token_info"
+FACEBOOK_GRAPH_URL = "https://graph.facebook.com/v18.0"
+FACEBOOK_INSIGHT_METRICS = ["page_impressions", "page_engaged_users", "page_fan_adds"]
+FACEBOOK_BATCH_SIZE = 50  # Graph API maximum sub-requests per batch call
+FACEBOOK_INSIGHTS_WINDOW_DAYS = 90  # Graph rejects since/until spans over 93 days
+FACEBOOK_BATCH_CONCURRENCY = int(os.getenv("FACEBOOK_BATCH_CONCURRENCY", "4"))  # Batch calls in flight per request
+
 def get_facebook_auth_url():
     """Generate the Facebook OAuth authorization URL"""
-    print(FACEBOOK_CLIENT_ID, FACEBOOK_CLIENT_SECRET)
-    return f"https://www.facebook.com/v18.0/dialog/oauth?client_id={FACEBOOK_CLIENT_ID}&redirect_uri={REDIRECT_URI}&scope=pages_read_engagement"
+    return get_oauth_provider("facebook").authorization_url
 
-def exchange_facebook_token(request: Request, code: str):
+async def exchange_facebook_token(request: Request, code: str):
     """Exchange the authorization code for an access token"""
-    token_url = f"https://graph.facebook.com/v18.0/oauth/access_token"
-    params = {
-        "client_id": FACEBOOK_CLIENT_ID,
-        "client_secret": FACEBOOK_CLIENT_SECRET,
-        "redirect_uri": REDIRECT_URI,
-        "code": code
-    }
-    
-    response = requests.get(token_url, params=params)
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail="Failed to retrieve access token")
-    
-    token_info = response.json()
-    save_token_to_session(request, token_info)
+    provider = get_oauth_provider("facebook")
+    token_info = await provider.exchange_code(code)
+    await save_token_to_session(request, token_info, key=provider.token_key)
     return token_info
 
-def get_page_insights(request: Request, page_id: str):
+@instrumented("facebook.page_insights")
+async def get_page_insights(request: Request, page_id: str):
     """Retrieve insights for a managed Facebook Page"""
-    token_info = get_token_from_session(request)
+    token_info = await get_token_from_session(request, key=FACEBOOK_TOKEN_KEY)
     access_token = token_info.get("access_token")
 
-    url = f"https://graph.facebook.com/v18.0/{page_id}/insights?metric=page_impressions,page_engaged_users,page_fan_adds&period=day&access_token={access_token}"
-    response = requests.get(url)
+    # The token goes in the Authorization header so it never ends up in URL logs
+    response = await http_get(
+        f"{FACEBOOK_GRAPH_URL}/{page_id}/insights",
+        params={"metric": ",".join(FACEBOOK_INSIGHT_METRICS), "period": "day"},
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
 
     if response.status_code != 200:
         raise HTTPException(status_code=400, detail="Failed to retrieve page insights")
 
     return response.json()
+
+def insights_windows(since: str, until: str = None):
+    """
+    Split a YYYY-MM-DD range into (since, until) unix-timestamp windows the insights edge accepts.
+    until defaults to today.
+    """
+    try:
+        start = datetime.strptime(since, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        end = (datetime.strptime(until, "%Y-%m-%d").replace(tzinfo=timezone.utc) if until
+               else datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)) + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since and until must be dates in YYYY-MM-DD format")
+    if start >= end:
+        raise HTTPException(status_code=400, detail="since must not be after until")
+    windows = []
+    while start < end:
+        window_end = min(start + timedelta(days=FACEBOOK_INSIGHTS_WINDOW_DAYS), end)
+        windows.append((int(start.timestamp()), int(window_end.timestamp())))
+        start = window_end
+    return windows
+
+def next_relative_url(next_url: str, until: int = None):
+    """
+    Turn a paging.next URL into a batch relative_url, or None once it moves past the requested range
+    (past now when no range was given)
+    """
+    parts = urlsplit(next_url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != "access_token"]
+    next_since = dict(query).get("since")
+    limit = until if until is not None else int(datetime.now(timezone.utc).timestamp())
+    if next_since and int(next_since) >= limit:
+        return None
+    path = parts.path.split("/", 2)[-1] if parts.path.startswith("/v") else parts.path.lstrip("/")
+    return f"{path}?{urlencode(query)}"
+
+@instrumented("facebook.graph_batch")
+async def run_graph_batch(access_token: str, sub_requests: list):
+    """Send up to FACEBOOK_BATCH_SIZE GET sub-requests in one Graph batch call; returns (status, body) per sub-request"""
+    response = await http_post(
+        FACEBOOK_GRAPH_URL,
+        data={
+            "access_token": access_token,
+            "include_headers": "false",
+            "batch": json.dumps([{"method": "GET", "relative_url": relative_url} for relative_url in sub_requests])
+        },
+        idempotent=True  # Every sub-request is a read
+    )
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail=f"Facebook batch request failed: {response.text}")
+    results = []
+    for item in response.json():
+        if item is None:  # Sub-request timed out on Facebook's side
+            results.append((504, {"error": {"message": "Batch sub-request timed out"}}))
+            continue
+        try:
+            body = json.loads(item.get("body") or "{}")
+        except ValueError:
+            body = {"error": {"message": item.get("body")}}
+        results.append((item.get("code"), body))
+    return results
+
+def normalize_insights(pages: dict, page_id: str, body: dict):
+    """Merge one insights response into pages[page_id][metric] as {end_time: value}"""
+    metrics = pages.setdefault(page_id, {})
+    for entry in body.get("data", []):
+        values = metrics.setdefault(entry["name"], {})
+        for point in entry.get("values", []):
+            values[point.get("end_time")] = point.get("value")
+
+@instrumented("facebook.batch_page_insights")
+async def get_batch_page_insights(request: Request, page_ids: list, metrics: list = None, period: str = "day",
+                                  since: str = None, until: str = None):
+    """
+    Fetch insights for many pages through Graph batch calls, splitting long ranges into windows and
+    following paging.next in further batch rounds. Results are normalized per page and metric.
+    """
+    token_info = await get_token_from_session(request, key=FACEBOOK_TOKEN_KEY)
+    access_token = token_info.get("access_token")
+    params = {"metric": ",".join(metrics or FACEBOOK_INSIGHT_METRICS), "period": period}
+
+    # Each pending sub-request is (page_id, relative_url, window end used to stop paging)
+    if until and not since:
+        raise HTTPException(status_code=400, detail="until requires since")
+    if since:
+        windows = insights_windows(since, until)
+        pending = [(page_id, f"{page_id}/insights?{urlencode({**params, 'since': start, 'until': end})}", end)
+                   for page_id in page_ids for start, end in windows]
+    else:
+        pending = [(page_id, f"{page_id}/insights?{urlencode(params)}", None) for page_id in page_ids]
+
+    pages, errors = {page_id: {} for page_id in page_ids}, {}
+    semaphore = asyncio.Semaphore(FACEBOOK_BATCH_CONCURRENCY)
+
+    async def run_chunk(chunk):
+        async with semaphore:
+            return chunk, await run_graph_batch(access_token, [relative_url for _, relative_url, _ in chunk])
+
+    while pending:
+        chunks = [pending[i:i + FACEBOOK_BATCH_SIZE] for i in range(0, len(pending), FACEBOOK_BATCH_SIZE)]
+        pending = []
+        for chunk, results in await asyncio.gather(*(run_chunk(chunk) for chunk in chunks)):
+            for (page_id, _, until_ts), (code, body) in zip(chunk, results):
+                if code != 200:
+                    errors[page_id] = (body.get("error") or {}).get("message", f"HTTP {code}")
+                    continue
+                normalize_insights(pages, page_id, body)
+                # Paging stops at the end of the range, or once a page comes back empty
+                next_url = (body.get("paging") or {}).get("next")
+                relative_url = next_relative_url(next_url, until_ts) if next_url and body.get("data") else None
+                if relative_url:
+                    pending.append((page_id, relative_url, until_ts))
+
+    return {
+        "pages": {
+            page_id: {
+                metric: [{"end_time": end_time, "value": value} for end_time, value in sorted(values.items())]
+                for metric, values in metrics_by_name.items()
+            }
+            for page_id, metrics_by_name in pages.items()
+        },
+        "errors": errors
+    }
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from datetime import date, timedelta
+from dotenv import load_dotenv
+load_dotenv()
+
+FACT_STORE_ENABLED = os.getenv("FACT_STORE_ENABLED", "true").lower() == "true"
+FACT_STORE_PATH = os.getenv("FACT_STORE_PATH", "fact_store.db")
+FACT_MUTABLE_DAYS = int(os.getenv("FACT_MUTABLE_DAYS", "3"))  # Upstreams keep revising the most recent days
+FACT_MAX_SPANS = int(os.getenv("FACT_MAX_SPANS", "4"))  # More gaps than this are fetched as one span
+FACT_RETENTION_DAYS = int(os.getenv("FACT_RETENTION_DAYS", "90"))  # Facts fetched longer ago are pruned (and refetched if asked for)
+
+_conn = None
+_lock = threading.Lock()
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(FACT_STORE_PATH, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS daily_facts ("
+            " source TEXT NOT NULL, entity_id TEXT NOT NULL, variant TEXT NOT NULL, day TEXT NOT NULL,"
+            " rows TEXT NOT NULL, fetched_at REAL NOT NULL,"
+            " PRIMARY KEY (source, entity_id, variant, day))"
+        )
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS fact_variants ("
+            " source TEXT NOT NULL, entity_id TEXT NOT NULL, variant TEXT NOT NULL, headers TEXT NOT NULL,"
+            " PRIMARY KEY (source, entity_id, variant))"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS daily_facts_fetched_at ON daily_facts (fetched_at)")
+    return _conn
+
+def variant_key(**parts):
+    """Identify a report shape (metrics, dimensions, filters) so different shapes never share facts"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:32]
+
+def last_immutable_day():
+    """Newest day whose upstream numbers are considered final"""
+    return date.today() - timedelta(days=FACT_MUTABLE_DAYS + 1)
+
+def days_between(start: date, end: date):
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+def missing_spans(start: date, end: date, stored_days):
+    """Contiguous (start, end) spans of days in the range that are not stored, merged down to FACT_MAX_SPANS"""
+    spans = []
+    for day in days_between(start, end):
+        if day.isoformat() in stored_days:
+            continue
+        if spans and spans[-1][1] == day - timedelta(days=1):
+            spans[-1][1] = day
+        else:
+            spans.append([day, day])
+    if len(spans) > FACT_MAX_SPANS:
+        spans = [[spans[0][0], spans[-1][1]]]
+    return [tuple(span) for span in spans]
+
+def _load_facts(source: str, entity_id: str, variant: str, start: date, end: date):
+    with _lock:
+        conn = _get_conn()
+        rows = conn.execute(
+            "SELECT day, rows FROM daily_facts WHERE source = ? AND entity_id = ? AND variant = ? AND day BETWEEN ? AND ?",
+            (source, entity_id, variant, start.isoformat(), end.isoformat())
+        ).fetchall()
+        header_row = conn.execute(
+            "SELECT headers FROM fact_variants WHERE source = ? AND entity_id = ? AND variant = ?",
+            (source, entity_id, variant)
+        ).fetchone()
+    headers = json.loads(header_row[0]) if header_row else None
+    return {day: json.loads(day_rows) for day, day_rows in rows}, headers
+
+def _save_facts(source: str, entity_id: str, variant: str, headers: dict, rows_by_day: dict):
+    cutoff = last_immutable_day().isoformat()
+    now = time.time()
+    records = [
+        (source, entity_id, variant, day, json.dumps(day_rows), now)
+        for day, day_rows in rows_by_day.items() if day <= cutoff
+    ]
+    with _lock:
+        conn = _get_conn()
+        conn.execute("BEGIN")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO fact_variants (source, entity_id, variant, headers) VALUES (?, ?, ?, ?)",
+                (source, entity_id, variant, json.dumps(headers))
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_facts (source, entity_id, variant, day, rows, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                records
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+async def load_facts(source: str, entity_id: str, variant: str, start: date, end: date):
+    """Return ({day: rows}, headers) for the stored days in the range"""
+    return await asyncio.to_thread(_load_facts, source, entity_id, variant, start, end)
+
+async def save_facts(source: str, entity_id: str, variant: str, headers: dict, rows_by_day: dict):
+    """Persist per-day rows; days that may still change upstream are skipped"""
+    await asyncio.to_thread(_save_facts, source, entity_id, variant, headers, rows_by_day)
+
+async def fetch_with_facts(source: str, entity_id: str, variant: str, start: date, end: date, fetch_span, read_facts: bool = True):
+    """
+    Serve a per-day report from stored facts, fetching only missing or still-mutable days.
+    fetch_span(span_start, span_end) must return (headers, {day: rows}) covering every day of the span.
+    Returns (headers, {day: rows}) for the whole range.
+    """
+    stored, headers = await load_facts(source, entity_id, variant, start, end) if read_facts else ({}, None)
+    if headers is None:
+        stored = {}
+    spans = missing_spans(start, end, stored)
+
+    results = await asyncio.gather(*(fetch_span(span_start, span_end) for span_start, span_end in spans))
+    rows_by_day = dict(stored)
+    for span_headers, span_rows in results:
+        headers = span_headers
+        rows_by_day.update(span_rows)
+        await save_facts(source, entity_id, variant, span_headers, span_rows)
+
+    return headers, rows_by_day
+
+def _prune_facts(cutoff: float):
+    with _lock:
+        conn = _get_conn()
+        conn.execute("BEGIN")
+        try:
+            deleted = conn.execute("DELETE FROM daily_facts WHERE fetched_at < ?", (cutoff,)).rowcount
+            conn.execute(
+                "DELETE FROM fact_variants WHERE NOT EXISTS (SELECT 1 FROM daily_facts WHERE"
+                " daily_facts.source = fact_variants.source AND daily_facts.entity_id = fact_variants.entity_id"
+                " AND daily_facts.variant = fact_variants.variant)"
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return deleted
+
+async def prune_facts():
+    """Delete facts fetched more than FACT_RETENTION_DAYS ago, and report shapes left without any; returns the rows deleted"""
+    if not FACT_STORE_ENABLED:
+        return 0
+    return await asyncio.to_thread(_prune_facts, time.time() - FACT_RETENTION_DAYS * 86400)
+
+def close_fact_store():
+    """Close the SQLite connection"""
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
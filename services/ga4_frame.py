@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+
+# GA4 metric types stored as integers; everything else (floats, currency, seconds) is float64
+INTEGER_METRIC_TYPES = {"TYPE_INTEGER"}
+
+# Ratio/average metrics cannot be summed; they are re-aggregated as a mean weighted by this metric
+WEIGHTED_METRICS = {
+    "bounceRate": "sessions",
+    "engagementRate": "sessions",
+    "averageSessionDuration": "sessions",
+    "sessionConversionRate": "sessions",
+    "retentionRate": "activeUsers",
+}
+
+# Unique-user counts: a user active in several rows is counted in each, so summing them over-counts.
+# Aggregating a report that carries one of these requires an explicit metric_agg for it.
+USER_COUNT_METRICS = {"activeUsers", "newUsers", "totalUsers", "active1DayUsers", "active7DayUsers", "active28DayUsers"}
+
+AGGREGATIONS = {"sum", "avg", "max", "weighted"}
+RESAMPLE_FREQUENCIES = {"day": "D", "week": "W-SUN", "month": "M"}
+OTHER_BUCKET = "(other)"
+
+def report_to_frame(report: dict):
+    """Convert a GA4 runReport response into a typed DataFrame (categorical dimensions, numeric metrics)"""
+    dimensions = [header["name"] for header in report.get("dimensionHeaders", [])]
+    metric_headers = report.get("metricHeaders", [])
+    rows = report.get("rows", [])
+
+    columns = {}
+    for index, name in enumerate(dimensions):
+        values = [row["dimensionValues"][index].get("value") for row in rows]
+        if name == "date":
+            columns[name] = pd.to_datetime(pd.Series(values, dtype="object"), format="%Y%m%d", errors="coerce")
+        else:
+            columns[name] = pd.Categorical(values)
+    for index, header in enumerate(metric_headers):
+        values = pd.to_numeric(pd.Series([row["metricValues"][index].get("value") for row in rows], dtype="object"), errors="coerce")
+        dtype = "int64" if header.get("type") in INTEGER_METRIC_TYPES and not values.isna().any() else "float64"
+        columns[header["name"]] = values.astype(dtype)
+
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(rows)))
+
+def parse_aggregation(group_by: str = None, metric_agg: str = None, top_n: int = None, top_by: str = None, resample: str = None):
+    """Parse the aggregation query parameters; returns None when no aggregation was requested"""
+    if not any([group_by, metric_agg, top_n, resample]):
+        return None
+
+    aggregations = {}
+    for item in filter(None, (metric_agg or "").split(",")):
+        metric, _, method = item.partition(":")
+        if method not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{method}' for {metric}; use one of {sorted(AGGREGATIONS)}")
+        aggregations[metric.strip()] = method
+    if resample and resample not in RESAMPLE_FREQUENCIES:
+        raise ValueError(f"Unknown resample period '{resample}'; use one of {sorted(RESAMPLE_FREQUENCIES)}")
+    if top_n is not None and top_n < 1:
+        raise ValueError("top_n must be at least 1")
+
+    return {
+        "group_by": [name.strip() for name in (group_by or "").split(",") if name.strip()],
+        "metric_agg": aggregations,
+        "top_n": top_n,
+        "top_by": top_by,
+        "resample": resample
+    }
+
+def _metric_methods(metrics: list, overrides: dict):
+    unresolved = [metric for metric in metrics if metric in USER_COUNT_METRICS and metric not in overrides]
+    if unresolved:
+        raise ValueError(
+            f"{', '.join(unresolved)} count unique users and cannot be combined across rows exactly; choose how with "
+            f"metric_agg (e.g. {unresolved[0]}:max for a lower bound, {unresolved[0]}:sum for an upper bound)"
+        )
+    methods = {}
+    for metric in metrics:
+        default = "weighted" if WEIGHTED_METRICS.get(metric) in metrics else "sum"
+        method = overrides.get(metric, default)
+        if method == "weighted" and WEIGHTED_METRICS.get(metric) not in metrics:
+            method = "avg"
+        methods[metric] = method
+    return methods
+
+def _group(df: pd.DataFrame, keys: list, methods: dict):
+    """Aggregate metrics over keys in one vectorized groupby pass"""
+    work = df.copy()
+    sums = {}
+    for metric, method in methods.items():
+        if method == "weighted":
+            weight = WEIGHTED_METRICS[metric]
+            work[f"__w_{metric}"] = work[metric] * work[weight]
+            work[f"__wt_{metric}"] = work[weight]
+            sums[f"__w_{metric}"] = "sum"
+            sums[f"__wt_{metric}"] = "sum"
+        elif method == "avg":
+            sums[metric] = "mean"
+        elif method == "max":
+            sums[metric] = "max"
+        else:
+            sums[metric] = "sum"
+
+    if keys:
+        grouped = work.groupby(keys, observed=True, sort=False).agg(sums).reset_index()
+    else:
+        grouped = pd.DataFrame({name: [work[name].agg(method)] for name, method in sums.items()})
+
+    for metric, method in methods.items():
+        if method == "weighted":
+            weights = grouped[f"__wt_{metric}"].astype("float64")
+            grouped[metric] = np.where(weights > 0, grouped[f"__w_{metric}"] / weights.where(weights > 0, 1), np.nan)
+    return grouped[keys + list(methods)]
+
+def aggregate_frame(df: pd.DataFrame, dimensions: list, metrics: list, aggregation: dict):
+    """Group, resample and bucket a GA4 frame on the server"""
+    group_by = aggregation["group_by"]
+    unknown = [name for name in group_by if name not in dimensions]
+    if unknown:
+        raise ValueError(f"Cannot group by {unknown}; available dimensions are {dimensions}")
+
+    df = df.copy()
+    methods = _metric_methods(metrics, aggregation["metric_agg"])
+    keys = list(group_by)
+
+    resample = aggregation["resample"]
+    if resample:
+        if "date" not in df:
+            raise ValueError("Resampling requires the date dimension")
+        df["date"] = df["date"].dt.to_period(RESAMPLE_FREQUENCIES[resample]).dt.start_time
+        if "date" not in keys:
+            keys.insert(0, "date")
+
+    top_n = aggregation["top_n"]
+    bucket_keys = [key for key in keys if key != "date"]
+    if top_n and bucket_keys:
+        top_by = aggregation["top_by"] or metrics[0]
+        if top_by not in metrics:
+            raise ValueError(f"Cannot rank by {top_by}; available metrics are {metrics}")
+        totals = _group(df, bucket_keys, {top_by: methods[top_by]}).nlargest(top_n, top_by)
+        in_top = df[bucket_keys].merge(totals[bucket_keys].assign(__top=1), on=bucket_keys, how="left")["__top"].notna().to_numpy()
+        for key in bucket_keys:
+            column = df[key].astype("object")
+            column[~in_top] = OTHER_BUCKET
+            df[key] = pd.Categorical(column)
+
+    result = _group(df, keys, methods)
+    if top_n and bucket_keys:
+        # Largest groups first, the "(other)" bucket last
+        top_by = aggregation["top_by"] or metrics[0]
+        is_other = (result[bucket_keys[0]].astype("object") == OTHER_BUCKET).to_numpy()
+        order = np.lexsort((-result[top_by].to_numpy(dtype="float64"), is_other))
+        result = result.iloc[order]
+    elif "date" in keys:
+        result = result.sort_values("date", kind="stable")
+    return result.reset_index(drop=True), keys, methods
+
+def frame_to_columns(df: pd.DataFrame):
+    """Serialize a frame column by column (dates as YYYY-MM-DD, NaN as null)"""
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            columns[name] = series.dt.strftime("%Y-%m-%d").tolist()
+        elif pd.api.types.is_numeric_dtype(series):
+            values = series.to_numpy()
+            columns[name] = [None if pd.isna(value) else value.item() for value in values]
+        else:
+            columns[name] = series.astype("object").tolist()
+    return columns
+
+def aggregate_ga4_report(report: dict, aggregation: dict):
+    """Aggregate a GA4 runReport response into a compact columnar payload"""
+    dimensions = [header["name"] for header in report.get("dimensionHeaders", [])]
+    metrics = [header["name"] for header in report.get("metricHeaders", [])]
+    df = report_to_frame(report)
+    result, keys, methods = aggregate_frame(df, dimensions, metrics, aggregation)
+
+    return {
+        "dimensions": keys,
+        "metrics": metrics,
+        "aggregations": methods,
+        "rowCount": len(result),
+        "sourceRowCount": len(df),
+        "columns": frame_to_columns(result)
+    }
@@ -0,0 +1,63 @@
+# GA4 Data API limits for a single runReport / batchRunReports call
+GA4_MAX_METRICS = 10
+GA4_MAX_DIMENSIONS = 9
+GA4_MAX_BATCH_REQUESTS = 5
+
+# Dimensions repeated in every sub-query so the split reports still line up
+GA4_JOIN_DIMENSIONS = ["date"]
+
+def split_ga4_metrics(metrics: list):
+    """Partition metrics into groups that fit one runReport"""
+    return [metrics[index:index + GA4_MAX_METRICS] for index in range(0, len(metrics), GA4_MAX_METRICS)] or [[]]
+
+def split_ga4_dimensions(dimensions: list):
+    """
+    Partition dimensions into groups that fit one runReport. Join dimensions (date) are kept in every
+    group; the first group is the primary report and keeps the original dimension order.
+    """
+    if len(dimensions) <= GA4_MAX_DIMENSIONS:
+        return [dimensions]
+    shared = [name for name in dimensions if name in GA4_JOIN_DIMENSIONS]
+    rest = [name for name in dimensions if name not in GA4_JOIN_DIMENSIONS]
+    size = GA4_MAX_DIMENSIONS - len(shared)
+    groups = []
+    for index in range(0, len(rest), size):
+        chunk = set(rest[index:index + size])
+        groups.append([name for name in dimensions if name in shared or name in chunk])
+    return groups
+
+def needs_ga4_plan(metrics: list, dimensions: list):
+    """Whether the field set exceeds what a single runReport accepts"""
+    return len(metrics) > GA4_MAX_METRICS or len(dimensions) > GA4_MAX_DIMENSIONS
+
+def join_ga4_reports(reports: list):
+    """
+    Join runReport responses over the same dimensions but different metrics into one response.
+    Rows are matched on their full dimension key; a row missing from one sub-report gets "0" for its metrics
+    (GA4 omits rows whose metrics are all zero).
+    """
+    if len(reports) == 1:
+        return reports[0]
+    joined = {key: value for key, value in reports[0].items() if key not in ("rows", "rowCount", "metricHeaders")}
+    joined["metricHeaders"] = [header for report in reports for header in report.get("metricHeaders", [])]
+
+    rows = {}
+    offset = 0
+    for report in reports:
+        width = len(report.get("metricHeaders", []))
+        for row in report.get("rows", []):
+            key = tuple(value.get("value") for value in row.get("dimensionValues", []))
+            joined_row = rows.get(key)
+            if joined_row is None:
+                joined_row = {
+                    "dimensionValues": row["dimensionValues"],
+                    "metricValues": [{"value": "0"} for _ in joined["metricHeaders"]]
+                }
+                rows[key] = joined_row
+            joined_row["metricValues"][offset:offset + width] = row.get("metricValues", [])
+        offset += width
+
+    if rows:
+        joined["rows"] = list(rows.values())
+    joined["rowCount"] = len(rows)
+    return joined
@@ -1,96 +1,116 @@
 import os
-import requests
+import logging
 import json
+import time
+import hashlib
+import asyncio
+import httpx
 from fastapi import Request, HTTPException
 from datetime import datetime, timedelta
-from google_auth_oauthlib.flow import Flow
-from services.token_service import save_token_to_session, get_token_from_session
+from services.token_service import save_token_to_session, get_token_from_session, coordinate_token_refresh
+from services.http_client import http_get, http_post
+from services.oauth_providers import get_oauth_provider
+from services.quota_scheduler import record_property_quota
+from services.resilience import UpstreamUnavailable
+from services.json_codec import dumps_json, loads_json, add_json_field
+from services.metrics import instrumented
+from services.ga4_frame import aggregate_ga4_report
+from services.report_merge import month_chunks, merge_ga4_reports, merge_youtube_reports
+from services.ga4_planner import (
+    GA4_MAX_BATCH_REQUESTS,
+    join_ga4_reports,
+    needs_ga4_plan,
+    split_ga4_dimensions,
+    split_ga4_metrics
+)
+from services.cache_service import (
+    cache_get,
+    cache_set,
+    cache_delete,
+    cached_call,
+    cached_call_bytes,
+    make_cache_key,
+    normalize_date,
+    resolve_date,
+    ttl_for_date_range
+)
+from services.fact_store import FACT_STORE_ENABLED, days_between, fetch_with_facts, variant_key
 from dotenv import load_dotenv
 load_dotenv()
 
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
-REDIRECT_URI = os.getenv("REDIRECT_URI", "https://f0k0kw0go4g0ko4o0gggoscw.vps.boomlive.in/auth/callback/google")
-
-def create_google_oauth_flow():
-    """Create and configure Google OAuth flow"""
-    client_config = {
-        "web": {
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "redirect_uris": [REDIRECT_URI]
-        }
-    }
-
-    flow = Flow.from_client_config(
-        client_config,
-        scopes=[
-            "https://www.googleapis.com/auth/analytics.readonly",
-            "https://www.googleapis.com/auth/analytics",
-            "https://www.googleapis.com/auth/analytics.edit",
-            "https://www.googleapis.com/auth/analytics.manage.users",  # Manage users (if needed)
-            "https://www.googleapis.com/auth/analytics.manage.users.readonly",  # Read user access levels
-            "https://www.googleapis.com/auth/analytics.provision",  # Admin access to GA accounts
-            "https://www.googleapis.com/auth/youtube",
-            "https://www.googleapis.com/auth/yt-analytics-monetary.readonly",
-            "https://www.googleapis.com/auth/youtube.readonly",
-            "https://www.googleapis.com/auth/yt-analytics.readonly",
-            "https://www.googleapis.com/auth/youtube.force-ssl",
-            "https://www.googleapis.com/auth/youtubepartner",
-            "https://www.googleapis.com/auth/youtube.channel-memberships.creator"
-        ],
-        redirect_uri=REDIRECT_URI
-    )
-    return flow
+logger = logging.getLogger(__name__)
+
+YOUTUBE_REPORT_TIMEOUT = float(os.getenv("YOUTUBE_REPORT_TIMEOUT", "20"))  # Per-report deadline in seconds
+DISCOVERY_CACHE_TTL = int(os.getenv("DISCOVERY_CACHE_TTL", "3600"))  # Property / content owner / channel lookups
+GA4_PAGE_SIZE = int(os.getenv("GA4_PAGE_SIZE", "100000"))  # Rows per runReport page (API maximum is 250000)
+GA4_STREAM_PAGE_SIZE = int(os.getenv("GA4_STREAM_PAGE_SIZE", "10000"))  # Smaller pages keep streaming memory flat
+RANGE_CHUNK_CONCURRENCY = int(os.getenv("RANGE_CHUNK_CONCURRENCY", "4"))  # Month chunks fetched at once per request
+GA4_METADATA_TTL = int(os.getenv("GA4_METADATA_TTL", "86400"))  # Property metadata rarely changes
+
+# Per-day YouTube report kept in the fact store
+YOUTUBE_DAILY_REPORT = "audience_insights"
+
+# ID-discovery endpoints
+YOUTUBE_CONTENT_OWNERS_URL = "https://www.googleapis.com/youtube/partner/v1/contentOwners?fetchMine=true"
+YOUTUBE_OWNER_CHANNEL_URL = "https://www.googleapis.com/youtube/v3/channels?part=id,snippet&mine=true"
+GA4_ACCOUNT_SUMMARIES_URL = "https://analyticsadmin.googleapis.com/v1beta/accountSummaries"
+GOOGLE_USERINFO_URL = "https://openidconnect.googleapis.com/v1/userinfo"
+
+# GA4 metrics and dimensions by access level
+GA4_VIEWER_METRICS = [
+    "activeUsers", "newUsers", "sessions", "engagedSessions", "screenPageViews", "bounceRate",
+    "engagementRate", "averageSessionDuration", "eventCount"
+]
+GA4_ADMIN_METRICS = [
+    "totalRevenue", "retentionRate", "newVsReturningUsers", "sessionConversionRate",
+    "audienceCategoryAffinity", "sessionQuality"
+]
+GA4_VIEWER_DIMENSIONS = ["date", "deviceCategory", "country", "city", "browser"]
+GA4_ADMIN_DIMENSIONS = ["sessionDefaultChannelGroup", "landingPage", "previousPagePath", "exitPage",
+                        "userEngagementDuration", "interests", "videoTitle", "contentType"]
 
 def get_google_auth_url():
     """Generate Google OAuth authorization URL"""
-    flow = create_google_oauth_flow()
-    auth_url, _ = flow.authorization_url(
-        access_type='offline',
-        include_granted_scopes='true',
-        prompt='consent'  # Force prompt to ensure refresh token
-    )
-    return auth_url
+    return get_oauth_provider("google").authorization_url
 
-def exchange_google_token(request: Request, code: str):
+async def exchange_google_token(request: Request, code: str):
     """Exchange authorization code for an access token"""
+    provider = get_oauth_provider("google")
     try:
-        flow = create_google_oauth_flow()
-        # Exchange code for credentials
-        flow.fetch_token(code=code)
-        
-        # Convert credentials to a dictionary and store in session
-        credentials = flow.credentials
-        token_info = {
-            "access_token": credentials.token,
-            "refresh_token": credentials.refresh_token,
-            "token_type": credentials.token_type,
-            "expires_at": credentials.expiry.timestamp() if credentials.expiry else None
-        }
-        
-        # Log successful token exchange
-        print(f"Successfully exchanged code for token. Access token: {credentials.token[:10]}...")
-        
-        # Save to session
-        save_token_to_session(request, token_info, key="google_token_info")
-        
-        return token_info
-    except Exception as e:
-        print(f"Error exchanging Google token: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Failed to exchange Google token: {str(e)}")
-    
+        token_info = await provider.exchange_code(code)
+    except HTTPException as e:
+        logger.error("Error exchanging Google token: %s", e.detail)
+        raise HTTPException(status_code=400, detail=f"Failed to exchange Google token: {e.detail}")
+
+    logger.info("Exchanged authorization code for a Google token")
+    # Refresh tokens change on every consent, so caches and prefetch are keyed by the account instead
+    token_info["account_id"] = await fetch_google_account_id(token_info["access_token"])
+
+    # Save to session
+    await save_token_to_session(request, token_info, key=provider.token_key)
+    return token_info
+
+async def fetch_google_account_id(access_token: str):
+    """Stable Google account ID (OpenID subject) for a fresh token; None when userinfo is unavailable"""
+    try:
+        response = await http_get(GOOGLE_USERINFO_URL, headers={"Authorization": f"Bearer {access_token}"})
+    except (httpx.HTTPError, UpstreamUnavailable) as e:
+        logger.warning("Google userinfo request failed: %s", e)
+        return None
+    if response.status_code != 200:
+        logger.warning("Google userinfo request failed with status %s", response.status_code)
+        return None
+    return response.json().get("sub")
 
-def refresh_google_token_if_needed(request: Request):
+@instrumented("google.token_refresh")
+async def refresh_google_token_if_needed(request: Request):
     """Check if token needs refresh and refresh it if necessary"""
-    token_info = get_token_from_session(request, key="google_token_info")
-    print("Existing Token Info:", token_info)  # Debugging
+    token_info = await get_token_from_session(request, key="google_token_info")
+    logger.debug("Existing Google token info: %s", token_info)
 
     # Ensure token has expiry info
     if not token_info or not token_info.get("expiry"):
-        print("No expiry timestamp found in session!")
+        logger.warning("Google token has no expiry timestamp")
         raise HTTPException(status_code=401, detail="No valid Google token found")
 
     # Convert expiry timestamp and check expiration
@@ -100,142 +120,333 @@ def refresh_google_token_if_needed(request: Request):
     expiry_time = datetime.strptime(expiry_str, "%Y-%m-%dT%H:%M:%S.%fZ").timestamp()
 
     if current_time + 300 >= expiry_time:
-        print("Token is expired or expiring soon, refreshing...")
+        logger.info("Google token is expired or expiring soon, refreshing")
 
         # Get refresh token
         refresh_token = token_info.get("refresh_token")
         if not refresh_token:
-            print("Missing refresh token!")
+            logger.warning("Google token has no refresh token")
             raise HTTPException(status_code=401, detail="No refresh token available")
 
-        # Prepare refresh request
-        token_url = "https://oauth2.googleapis.com/token"
-        payload = {
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "refresh_token": refresh_token,
-            "grant_type": "refresh_token"
-        }
+        async def refresh():
+            return await get_oauth_provider("google").refresh(refresh_token)
 
-        response = requests.post(token_url, data=payload)
-        if response.status_code != 200:
-            print("Google OAuth refresh error:", response.json())  # Debugging
-            raise HTTPException(status_code=401, detail=f"Failed to refresh Google token: {response.json()}")
+        # Concurrent requests holding the same refresh token share a single refresh
+        new_token_info = await coordinate_token_refresh("google", refresh_token, refresh)
 
-        # Update token info
-        new_token_info = response.json()
+        # Update token info (both the credentials-JSON keys we read and the legacy keys)
+        # (expires_at shares the naive-UTC timestamp basis used for current_time above)
+        new_expiry = datetime.fromtimestamp(new_token_info["expires_at"])
         token_info.update({
+            "token": new_token_info["access_token"],
+            "expiry": new_expiry.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
             "access_token": new_token_info["access_token"],
-            "expires_at": current_time + new_token_info["expires_in"]
+            "expires_at": new_token_info["expires_at"]
         })
 
         # Save updated token info to session
-        save_token_to_session(request, token_info, key="google_token_info")
-        print("Token refreshed successfully:", token_info)
+        await save_token_to_session(request, token_info, key="google_token_info")
+        logger.info("Google token refreshed, expires at %s", token_info["expiry"])
 
     else:
-        print("Token is still valid!")
+        logger.debug("Google token is still valid")
 
     return token_info
 
-def get_partner_channels(request: Request):
-    """Retrieve all YouTube Partner Channels where the user has access"""
-    token_info = refresh_google_token_if_needed(request)
-    access_token = token_info.get("token")
+def google_user_scope(token_info: dict):
+    """
+    Hash scoping cached data and facts to the Google account that fetched it. It is stable across logins
+    (the OpenID subject); tokens stored before account IDs were recorded fall back to the refresh token.
+    """
+    if token_info.get("account_id"):
+        return hashlib.sha256(f"account:{token_info['account_id']}".encode()).hexdigest()[:32]
+    user_secret = token_info.get("refresh_token") or token_info.get("token") or ""
+    return hashlib.sha256(user_secret.encode()).hexdigest()[:32]
+
+def discovery_cache_key(token_info: dict, lookup: str):
+    """Per-user cache key for a discovery lookup, scoped to the user's Google account"""
+    return make_cache_key("discovery", user=google_user_scope(token_info), lookup=lookup)
+
+async def fetch_discovery_bytes(token_info: dict, lookup: str, url: str, error_message: str, refresh_discovery: bool = False):
+    """
+    Fetch an ID-discovery endpoint (account summaries, content owners, owned channel) once per user
+    and serve it from cache for DISCOVERY_CACHE_TTL seconds; refresh_discovery forces a refetch.
+    The upstream JSON body is cached and returned as bytes, untouched.
+    """
+    async def fetch():
+        headers = {"Authorization": f"Bearer {token_info.get('token')}"}
+        response = await http_get(url, headers=headers)
 
-    url = "https://www.googleapis.com/youtube/partner/v1/contentOwners?fetchMine=true"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(url, headers=headers)
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail=f"{error_message}: {response.text}")
 
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail=f"Failed to retrieve partner channels: {response.text}")
+        return response.content
 
-    return response.json()
+    cache_key = discovery_cache_key(token_info, lookup)
+    return await cached_call_bytes(cache_key, DISCOVERY_CACHE_TTL, fetch, invalidate_cache=refresh_discovery)
 
-def get_owner_channel(request: Request):
-    """Retrieve the authenticated user's YouTube Channel ID"""
-    token_info = refresh_google_token_if_needed(request)
-    access_token = token_info.get("token")
+async def fetch_discovery(token_info: dict, lookup: str, url: str, error_message: str, refresh_discovery: bool = False):
+    """Parsed form of fetch_discovery_bytes, for callers that read the discovered IDs"""
+    return loads_json(await fetch_discovery_bytes(token_info, lookup, url, error_message, refresh_discovery))
 
-    url = "https://www.googleapis.com/youtube/v3/channels?part=id,snippet&mine=true"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(url, headers=headers)
+@instrumented("youtube.partner_channels")
+async def get_partner_channels(request: Request, refresh_discovery: bool = False, raw: bool = False):
+    """Retrieve all YouTube Partner Channels where the user has access (raw: the upstream JSON bytes)"""
+    token_info = await refresh_google_token_if_needed(request)
 
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail=f"Failed to retrieve owner's channel: {response.text}")
+    fetch = fetch_discovery_bytes if raw else fetch_discovery
+    return await fetch(token_info, "content_owners", YOUTUBE_CONTENT_OWNERS_URL,
+                       "Failed to retrieve partner channels", refresh_discovery)
 
-    return response.json()
+@instrumented("youtube.owner_channel")
+async def get_owner_channel(request: Request, refresh_discovery: bool = False, raw: bool = False):
+    """Retrieve the authenticated user's YouTube Channel ID (raw: the upstream JSON bytes)"""
+    token_info = await refresh_google_token_if_needed(request)
 
-def get_combined_youtube_analytics(request: Request, content_owner_id: str, start_date: str, end_date: str):
-    """Retrieve monetization, views, engagement, and audience demographics in a single response"""
-    token_info = refresh_google_token_if_needed(request)
-    access_token = token_info.get("token")
-    headers = {"Authorization": f"Bearer {access_token}"}
+    fetch = fetch_discovery_bytes if raw else fetch_discovery
+    return await fetch(token_info, "owner_channel", YOUTUBE_OWNER_CHANNEL_URL,
+                       "Failed to retrieve owner's channel", refresh_discovery)
 
-    # API URLs for different data types
-    urls = {
+def build_youtube_report_urls(content_owner_id: str, start_date: str, end_date: str):
+    """Build the YouTube Analytics report URLs for a content owner and date range"""
+    return {
         "monetization": f"https://youtubeanalytics.googleapis.com/v2/reports?ids=contentOwner=={content_owner_id}&startDate={start_date}&endDate={end_date}&metrics=estimatedRevenue,estimatedAdRevenue,estimatedRedPartnerRevenue&dimensions=month&sort=-month",
         "audience_insights": f"https://youtubeanalytics.googleapis.com/v2/reports?ids=contentOwner=={content_owner_id}&startDate={start_date}&endDate={end_date}&metrics=views,estimatedMinutesWatched,averageViewDuration,subscribersGained,likes,comments&dimensions=day&sort=-day",
         "demographics": f"https://youtubeanalytics.googleapis.com/v2/reports?ids=contentOwner=={content_owner_id}&startDate={start_date}&endDate={end_date}&metrics=viewerPercentage&dimensions=ageGroup,gender"
     }
 
-    # Make all API requests
-    combined_data = {}
-    for key, url in urls.items():
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            combined_data[key] = response.json()
+async def request_youtube_report(url: str, headers: dict):
+    """Send one YouTube Analytics request, returning (status code, JSON body or error text)"""
+    response = await http_get(url, headers=headers)
+    return response.status_code, response.json() if response.status_code == 200 else response.text
+
+async def request_youtube_report_chunked(content_owner_id: str, key: str, start_date: str, end_date: str, headers: dict,
+                                        semaphore: asyncio.Semaphore):
+    """
+    Request a YouTube report as concurrent month-sized chunks (bounded by semaphore) and merge
+    them back into one response, re-aggregating non-additive metrics across chunks
+    """
+    url = build_youtube_report_urls(content_owner_id, start_date, end_date)[key]
+    try:
+        chunks = month_chunks(resolve_date(start_date), resolve_date(end_date))
+    except (TypeError, ValueError):
+        chunks = []
+    if len(chunks) <= 1:
+        return await request_youtube_report(url, headers)
+
+    async def fetch_chunk(chunk_start, chunk_end):
+        async with semaphore:
+            chunk_url = build_youtube_report_urls(content_owner_id, chunk_start.isoformat(), chunk_end.isoformat())[key]
+            if key != "demographics":
+                return await request_youtube_report(chunk_url, headers), None
+
+            # viewerPercentage is a share, so each chunk is weighted by its total views
+            views_url = build_youtube_views_total_url(content_owner_id, chunk_start.isoformat(), chunk_end.isoformat())
+            result, views = await asyncio.gather(request_youtube_report(chunk_url, headers), request_youtube_report(views_url, headers))
+            weight = (views[1].get("rows") or [[0]])[0][0] if views[0] == 200 else None
+            return result, weight
+
+    results = await asyncio.gather(*(fetch_chunk(chunk_start, chunk_end) for chunk_start, chunk_end in chunks))
+    for (status_code, body), _ in results:
+        if status_code != 200:
+            return status_code, body
+
+    return 200, merge_youtube_reports(
+        [body for (_, body), _ in results],
+        chunk_weights=[weight for _, weight in results],
+        sort_descending="&sort=-" in url
+    )
+
+async def request_youtube_daily_report(content_owner_id: str, user_scope: str, start_date: str, end_date: str, headers: dict,
+                                       read_facts: bool = True, chunk_semaphore: asyncio.Semaphore = None):
+    """
+    Request the per-day audience_insights report through the fact store, so only days that are
+    missing or may still change are fetched from YouTube. Stored facts are scoped to user_scope.
+    """
+    try:
+        start, end = resolve_date(start_date), resolve_date(end_date)
+    except (TypeError, ValueError):
+        return await request_youtube_report(build_youtube_report_urls(content_owner_id, start_date, end_date)[YOUTUBE_DAILY_REPORT], headers)
+    if start > end:
+        return 400, f"start_date {start_date} is after end_date {end_date}"
+
+    async def fetch_span(span_start, span_end):
+        if chunk_semaphore is not None:
+            status_code, body = await request_youtube_report_chunked(content_owner_id, YOUTUBE_DAILY_REPORT, span_start.isoformat(),
+                                                                     span_end.isoformat(), headers, chunk_semaphore)
+        else:
+            url = build_youtube_report_urls(content_owner_id, span_start.isoformat(), span_end.isoformat())[YOUTUBE_DAILY_REPORT]
+            status_code, body = await request_youtube_report(url, headers)
+        if status_code != 200:
+            raise HTTPException(status_code=status_code, detail=body)
+
+        day_index = [column["name"] for column in body.get("columnHeaders", [])].index("day")
+        rows_by_day = {day.isoformat(): [] for day in days_between(span_start, span_end)}
+        for row in body.get("rows", []):
+            rows_by_day.setdefault(row[day_index], []).append(row)
+        return {key: value for key, value in body.items() if key != "rows"}, rows_by_day
+
+    try:
+        report_headers, rows_by_day = await fetch_with_facts(
+            "youtube_audience_insights", content_owner_id, variant_key(user=user_scope, report=YOUTUBE_DAILY_REPORT),
+            start, end, fetch_span, read_facts=read_facts
+        )
+    except UpstreamUnavailable:
+        raise
+    except HTTPException as e:
+        return e.status_code, e.detail
+
+    # Same ordering as the upstream query (sort=-day)
+    report = dict(report_headers or {})
+    report["rows"] = [row for day in sorted(rows_by_day, reverse=True) for row in rows_by_day[day]]
+    return 200, report
+
+def build_youtube_views_total_url(content_owner_id: str, start_date: str, end_date: str):
+    """Total views for a content owner and date range (used to weight share metrics across chunks)"""
+    return f"https://youtubeanalytics.googleapis.com/v2/reports?ids=contentOwner=={content_owner_id}&startDate={start_date}&endDate={end_date}&metrics=views"
+
+@instrumented("youtube.report")
+async def fetch_youtube_report(key: str, load, cache_key: str = None, ttl: int = None,
+                               bypass_cache: bool = False, invalidate_cache: bool = False):
+    """
+    Fetch one YouTube Analytics report within the per-report deadline, serving it from cache when possible.
+    load() performs the upstream request and returns (status code, JSON body or error text).
+    """
+    started = time.perf_counter()
+    status = {"status": "ok", "cache": "bypass" if bypass_cache or not cache_key else "miss"}
+
+    if status["cache"] == "miss":
+        if invalidate_cache:
+            await cache_delete(cache_key)
         else:
-            combined_data[key] = {"error": f"Failed to fetch {key} data: {response.text}"}
+            cached = await cache_get(cache_key)
+            if cached is not None:
+                status["cache"] = "hit"
+                status["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                return cached, status
+
+    try:
+        status_code, body = await asyncio.wait_for(load(), timeout=YOUTUBE_REPORT_TIMEOUT)
+        status["http_status"] = status_code
+        if status_code == 200:
+            data = body
+            if status["cache"] == "miss":
+                await cache_set(cache_key, data, ttl)
+        else:
+            status["status"] = "error"
+            data = {"error": f"Failed to fetch {key} data: {body}"}
+    except asyncio.TimeoutError:
+        status["status"] = "timeout"
+        data = {"error": f"Timed out fetching {key} data after {YOUTUBE_REPORT_TIMEOUT}s"}
+    except httpx.HTTPError as e:
+        status["status"] = "error"
+        data = {"error": f"Failed to fetch {key} data: {str(e)}"}
+    except UpstreamUnavailable as e:
+        # Serve the last good copy while the upstream is unhealthy
+        stale = await cache_get(cache_key, allow_stale=True) if cache_key and not invalidate_cache else None
+        if stale is not None:
+            status["cache"] = "stale"
+            data = stale
+        else:
+            status["status"] = "unavailable"
+            data = {"error": f"Failed to fetch {key} data: {e.detail}"}
+
+    status["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return data, status
+
+async def fetch_youtube_reports(urls: dict, headers: dict, content_owner_id: str, start_date: str, end_date: str,
+                                user_scope: str, bypass_cache: bool = False, invalidate_cache: bool = False,
+                                chunk_by_month: bool = False):
+    """
+    Fetch all YouTube reports concurrently, returning partial results plus a per-report status block.
+    Cached reports are scoped to user_scope, so one user's reports are never served to another.
+    With chunk_by_month, long ranges are split into month chunks that share one concurrency cap.
+    """
+    ttl = ttl_for_date_range(start_date, end_date)
+    read_facts = not (bypass_cache or invalidate_cache)
+    chunk_semaphore = asyncio.Semaphore(RANGE_CHUNK_CONCURRENCY) if chunk_by_month else None
+
+    def loader(key, url):
+        if key == YOUTUBE_DAILY_REPORT and FACT_STORE_ENABLED:
+            return lambda: request_youtube_daily_report(content_owner_id, user_scope, start_date, end_date, headers,
+                                                        read_facts, chunk_semaphore)
+        if chunk_semaphore is not None:
+            return lambda: request_youtube_report_chunked(content_owner_id, key, start_date, end_date, headers, chunk_semaphore)
+        return lambda: request_youtube_report(url, headers)
+
+    results = await asyncio.gather(*(
+        fetch_youtube_report(
+            key, loader(key, url),
+            cache_key=make_cache_key(
+                "youtube_report",
+                user=user_scope,
+                content_owner_id=content_owner_id,
+                report=key,
+                start_date=normalize_date(start_date),
+                end_date=normalize_date(end_date),
+                url=url
+            ),
+            ttl=ttl,
+            bypass_cache=bypass_cache,
+            invalidate_cache=invalidate_cache
+        )
+        for key, url in urls.items()
+    ))
+
+    combined_data = {}
+    report_status = {}
+    for key, (data, status) in zip(urls, results):
+        combined_data[key] = data
+        report_status[key] = status
+    combined_data["report_status"] = report_status
 
     return combined_data
 
-def get_combined_youtube_analytics_auto(request: Request, start_date: str, end_date: str):
-    """Automatically retrieve YouTube analytics without requiring content_owner_id"""
-    token_info = refresh_google_token_if_needed(request)
+@instrumented("youtube.combined_analytics")
+async def get_combined_youtube_analytics(request: Request, content_owner_id: str, start_date: str, end_date: str,
+                                         bypass_cache: bool = False, invalidate_cache: bool = False, chunk_by_month: bool = False):
+    """Retrieve monetization, views, engagement, and audience demographics in a single response"""
+    token_info = await refresh_google_token_if_needed(request)
     access_token = token_info.get("token")
     headers = {"Authorization": f"Bearer {access_token}"}
 
-    # Fetch the authenticated user's content owner ID automatically
-    url_owner = "https://www.googleapis.com/youtube/partner/v1/contentOwners?fetchMine=true"
-    owner_response = requests.get(url_owner, headers=headers)
+    # Run all report requests concurrently
+    urls = build_youtube_report_urls(content_owner_id, start_date, end_date)
+    return await fetch_youtube_reports(urls, headers, content_owner_id, start_date, end_date, google_user_scope(token_info),
+                                       bypass_cache=bypass_cache, invalidate_cache=invalidate_cache,
+                                       chunk_by_month=chunk_by_month)
+
+@instrumented("youtube.combined_analytics_auto")
+async def get_combined_youtube_analytics_auto(request: Request, start_date: str, end_date: str,
+                                              bypass_cache: bool = False, invalidate_cache: bool = False,
+                                              refresh_discovery: bool = False, chunk_by_month: bool = False):
+    """Automatically retrieve YouTube analytics without requiring content_owner_id"""
+    token_info = await refresh_google_token_if_needed(request)
+    access_token = token_info.get("token")
+    headers = {"Authorization": f"Bearer {access_token}"}
 
-    if owner_response.status_code != 200:
-        raise HTTPException(status_code=400, detail="Failed to fetch YouTube content owner ID")
+    # Look up the authenticated user's content owner ID (cached per user)
+    content_owners = await fetch_discovery(token_info, "content_owners", YOUTUBE_CONTENT_OWNERS_URL,
+                                           "Failed to fetch YouTube content owner ID", refresh_discovery)
 
-    content_owner_id = owner_response.json().get("items", [{}])[0].get("id", None)
+    content_owner_id = (content_owners.get("items") or [{}])[0].get("id", None)
     if not content_owner_id:
         raise HTTPException(status_code=404, detail="No YouTube content owner ID found")
 
     # Use fetched content_owner_id for analytics requests
-    urls = {
-        "monetization": f"https://youtubeanalytics.googleapis.com/v2/reports?ids=contentOwner=={content_owner_id}&startDate={start_date}&endDate={end_date}&metrics=estimatedRevenue,estimatedAdRevenue,estimatedRedPartnerRevenue&dimensions=month&sort=-month",
-        "audience_insights": f"https://youtubeanalytics.googleapis.com/v2/reports?ids=contentOwner=={content_owner_id}&startDate={start_date}&endDate={end_date}&metrics=views,estimatedMinutesWatched,averageViewDuration,subscribersGained,likes,comments&dimensions=day&sort=-day",
-        "demographics": f"https://youtubeanalytics.googleapis.com/v2/reports?ids=contentOwner=={content_owner_id}&startDate={start_date}&endDate={end_date}&metrics=viewerPercentage&dimensions=ageGroup,gender"
-    }
-
-    combined_data = {}
-    for key, url in urls.items():
-        response = requests.get(url, headers=headers)
-        combined_data[key] = response.json() if response.status_code == 200 else {"error": f"Failed to fetch {key} data: {response.text}"}
-
-    return combined_data
+    urls = build_youtube_report_urls(content_owner_id, start_date, end_date)
+    return await fetch_youtube_reports(urls, headers, content_owner_id, start_date, end_date, google_user_scope(token_info),
+                                       bypass_cache=bypass_cache, invalidate_cache=invalidate_cache,
+                                       chunk_by_month=chunk_by_month)
 
 
-def get_ga4_property(request: Request):
+@instrumented("ga4.account_summaries")
+async def get_ga4_property(request: Request, refresh_discovery: bool = False):
     """Retrieve the authenticated user's GA4 Property ID using accountSummaries"""
-    token_info = refresh_google_token_if_needed(request)
-    access_token = token_info.get("token")
+    token_info = await refresh_google_token_if_needed(request)
 
-    url = "https://analyticsadmin.googleapis.com/v1beta/accountSummaries"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    
-    response = requests.get(url, headers=headers)
-
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail=f"Failed to retrieve GA4 properties: {response.text}")
-
-    account_summaries = response.json()
+    account_summaries = await fetch_discovery(token_info, "account_summaries", GA4_ACCOUNT_SUMMARIES_URL,
+                                              "Failed to retrieve GA4 properties", refresh_discovery)
     
     if not account_summaries.get("accountSummaries"):
         raise HTTPException(status_code=404, detail="No GA4 properties found for the authenticated user.")
@@ -254,89 +465,386 @@ def get_ga4_property(request: Request):
 
     return {"success": True, "properties": ga4_properties}
 
-def get_combined_ga4_analytics(request: Request, property_id: str, start_date: str, end_date: str, has_admin_access: bool):
-    """Retrieve GA4 analytics with available metrics based on user permissions"""
-    token_info = refresh_google_token_if_needed(request)
-    access_token = token_info.get("token")
-
-    # Define metrics based on user permissions
-    viewer_metrics = [
-        "activeUsers", "newUsers", "sessions", "engagedSessions", "screenPageViews", "bounceRate",
-        "engagementRate", "averageSessionDuration", "eventCount"
-    ]
-    
-    admin_metrics = [
-        "totalRevenue", "retentionRate", "newVsReturningUsers", "sessionConversionRate",
-        "audienceCategoryAffinity", "sessionQuality"
-    ]
+def get_ga4_fields(has_admin_access: bool):
+    """Return the GA4 metrics and dimensions available for the user's access level"""
+    metrics = GA4_VIEWER_METRICS if not has_admin_access else GA4_VIEWER_METRICS + GA4_ADMIN_METRICS
+    dimensions = GA4_VIEWER_DIMENSIONS if not has_admin_access else GA4_VIEWER_DIMENSIONS + GA4_ADMIN_DIMENSIONS
+    return metrics, dimensions
 
-    # Select metrics based on access level
-    metrics = viewer_metrics if not has_admin_access else viewer_metrics + admin_metrics
+@instrumented("ga4.metadata")
+async def get_ga4_metadata(access_token: str, property_id: str, user_scope: str):
+    """Fetch (or serve from cache, per user) the metric and dimension API names available on a GA4 property"""
+    url = f"https://analyticsdata.googleapis.com/v1beta/properties/{property_id}/metadata"
 
-    # Define dimensions based on user permissions
-    viewer_dimensions = ["date", "deviceCategory", "country", "city", "browser"]
-    
-    admin_dimensions = ["sessionDefaultChannelGroup", "landingPage", "previousPagePath", "exitPage",
-                        "userEngagementDuration", "interests", "videoTitle", "contentType"]
+    async def fetch():
+        response = await http_get(url, headers={"Authorization": f"Bearer {access_token}"})
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=f"Failed to fetch GA4 metadata: {response.text}")
+        metadata = response.json()
+        return {
+            "metrics": [metric["apiName"] for metric in metadata.get("metrics", [])],
+            "dimensions": [dimension["apiName"] for dimension in metadata.get("dimensions", [])]
+        }
 
-    dimensions = viewer_dimensions if not has_admin_access else viewer_dimensions + admin_dimensions
+    return await cached_call(make_cache_key("ga4_metadata", user=user_scope, property_id=property_id), GA4_METADATA_TTL, fetch)
 
-    # Prepare API request body
-    request_body = {
+async def validate_ga4_fields(access_token: str, property_id: str, user_scope: str, metrics: list, dimensions: list,
+                              strict: bool = False):
+    """
+    Check metrics and dimensions against the property's metadata before any report call.
+    Unknown fields are dropped, or rejected with a 400 when strict; returns (metrics, dimensions, dropped).
+    """
+    try:
+        metadata = await get_ga4_metadata(access_token, property_id, user_scope)
+    except HTTPException as e:
+        # Without metadata runReport validates the fields itself, as it did before
+        logger.warning("GA4 metadata unavailable for property %s: %s", property_id, e.detail)
+        return metrics, dimensions, None
+
+    known_metrics, known_dimensions = set(metadata["metrics"]), set(metadata["dimensions"])
+    dropped = {
+        "metrics": [metric for metric in metrics if metric not in known_metrics],
+        "dimensions": [dimension for dimension in dimensions if dimension not in known_dimensions]
+    }
+    if not dropped["metrics"] and not dropped["dimensions"]:
+        return metrics, dimensions, None
+    if strict:
+        raise HTTPException(status_code=400, detail=f"Fields not available on GA4 property {property_id}: {dropped}")
+
+    return ([metric for metric in metrics if metric in known_metrics],
+            [dimension for dimension in dimensions if dimension in known_dimensions],
+            dropped)
+
+def build_ga4_request_body(start_date: str, end_date: str, metrics: list, dimensions: list):
+    """Build a runReport request body"""
+    return {
         "dateRanges": [{"startDate": start_date, "endDate": end_date}],
         "metrics": [{"name": metric} for metric in metrics],
-        "dimensions": [{"name": dim} for dim in dimensions]
+        "dimensions": [{"name": dim} for dim in dimensions],
+        "returnPropertyQuota": True
     }
 
+async def iter_ga4_report_pages(access_token: str, property_id: str, request_body: dict, page_size: int = None,
+                                offset: int = 0):
+    """Yield runReport pages, following offset/limit until the report's rowCount is exhausted"""
     url = f"https://analyticsdata.googleapis.com/v1beta/properties/{property_id}:runReport"
     headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+    limit = page_size or GA4_PAGE_SIZE
 
-    response = requests.post(url, headers=headers, json=request_body)
-    print(request_body, "request_body")
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail=f"GA4 Analytics request failed: {response.text}")
+    while True:
+        page_body = {**request_body, "offset": offset, "limit": limit}
+        response = await http_post(url, headers=headers, json=page_body, idempotent=True)  # runReport is read-only
+        logger.debug("GA4 runReport page for property %s", property_id, extra={"request_body": page_body})
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail=f"GA4 Analytics request failed: {response.text}")
+
+        page = response.json()
+        record_property_quota(property_id, page.pop("propertyQuota", None))
+        yield page
+
+        rows = page.get("rows", [])
+        offset += len(rows)
+        if not rows or offset >= page.get("rowCount", 0):
+            break
+
+@instrumented("ga4.batch_run_reports")
+async def fetch_ga4_batch(access_token: str, property_id: str, request_bodies: list):
+    """
+    Run several runReport bodies through batchRunReports (GA4_MAX_BATCH_REQUESTS per call, calls sent
+    concurrently) and follow up with runReport pages for any report larger than one page
+    """
+    url = f"https://analyticsdata.googleapis.com/v1beta/properties/{property_id}:batchRunReports"
+    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
 
-    return response.json()
+    async def run_batch(bodies):
+        batch_body = {"requests": [{**body, "offset": 0, "limit": GA4_PAGE_SIZE} for body in bodies]}
+        response = await http_post(url, headers=headers, json=batch_body, idempotent=True)
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail=f"GA4 Analytics batch request failed: {response.text}")
+        reports = response.json().get("reports", [])
+        for report in reports:
+            record_property_quota(property_id, report.pop("propertyQuota", None))
+        return reports
+
+    batches = [request_bodies[index:index + GA4_MAX_BATCH_REQUESTS]
+               for index in range(0, len(request_bodies), GA4_MAX_BATCH_REQUESTS)]
+    reports = [report for batch in await asyncio.gather(*(run_batch(bodies) for bodies in batches)) for report in batch]
+
+    async def complete(report, request_body):
+        rows = report.get("rows", [])
+        if rows and len(rows) < report.get("rowCount", 0):
+            async for page in iter_ga4_report_pages(access_token, property_id, request_body, offset=len(rows)):
+                rows.extend(page.get("rows", []))
+        return report
+
+    return await asyncio.gather(*(complete(report, body) for report, body in zip(reports, request_bodies)))
+
+@instrumented("ga4.run_report")
+async def fetch_ga4_reports(access_token: str, property_id: str, request_bodies: list):
+    """
+    Run several GA4 reports, each returned with every page merged into a single runReport response.
+    More metrics than one runReport accepts are split into sub-queries; the sub-queries of all reports
+    share batchRunReports calls and are joined back per row.
+    """
+    metric_groups = [split_ga4_metrics([metric["name"] for metric in body.get("metrics", [])]) for body in request_bodies]
+    if len(request_bodies) == 1 and len(metric_groups[0]) == 1:
+        report = None
+        async for page in iter_ga4_report_pages(access_token, property_id, request_bodies[0]):
+            if report is None:
+                report = page
+            elif page.get("rows"):
+                report.setdefault("rows", []).extend(page["rows"])
+        return [report]
+
+    sub_bodies = [{**body, "metrics": [{"name": metric} for metric in group]}
+                  for body, groups in zip(request_bodies, metric_groups) for group in groups]
+    sub_reports = await fetch_ga4_batch(access_token, property_id, sub_bodies)
+    reports, index = [], 0
+    for groups in metric_groups:
+        reports.append(join_ga4_reports(sub_reports[index:index + len(groups)]))
+        index += len(groups)
+    return reports
+
+async def fetch_ga4_group_reports(access_token: str, property_id: str, start_date: str, end_date: str,
+                                  metrics: list, dimension_groups: list, chunk_semaphore: asyncio.Semaphore = None):
+    """
+    Fetch one GA4 report per dimension group over the same range; every metric and dimension sub-query
+    of every group shares the batchRunReports calls. With a chunk semaphore, long ranges are fetched as
+    concurrent month-sized chunks (bounded by it) and merged back per group, re-aggregating ratio
+    metrics for rows that span several chunks.
+    """
+    chunks = []
+    if chunk_semaphore is not None:
+        try:
+            chunks = month_chunks(resolve_date(start_date), resolve_date(end_date))
+        except (TypeError, ValueError):
+            chunks = []
+    if len(chunks) <= 1:
+        return await fetch_ga4_reports(access_token, property_id, [
+            build_ga4_request_body(start_date, end_date, metrics, dimensions) for dimensions in dimension_groups
+        ])
+
+    async def fetch_chunk(chunk_start, chunk_end):
+        async with chunk_semaphore:
+            return await fetch_ga4_reports(access_token, property_id, [
+                build_ga4_request_body(chunk_start.isoformat(), chunk_end.isoformat(), metrics, dimensions)
+                for dimensions in dimension_groups
+            ])
+
+    chunk_reports = await asyncio.gather(*(fetch_chunk(chunk_start, chunk_end) for chunk_start, chunk_end in chunks))
+    return [merge_ga4_reports([reports[index] for reports in chunk_reports]) for index in range(len(dimension_groups))]
+
+async def fetch_ga4_reports_with_facts(access_token: str, property_id: str, user_scope: str, start_date: str, end_date: str,
+                                      metrics: list, dimension_groups: list, read_facts: bool = True,
+                                      chunk_semaphore: asyncio.Semaphore = None):
+    """
+    Run date-dimensioned GA4 reports (one per dimension group) through the per-day fact store: closed
+    days come from the local store and only missing or still-mutable days are requested from GA4.
+    A span missing for any group is fetched once for all groups, so their sub-queries share batches.
+    Stored facts are scoped to user_scope, so they are only served to the user who fetched them.
+    """
+    try:
+        start, end = resolve_date(start_date), resolve_date(end_date)
+    except (TypeError, ValueError):
+        return await fetch_ga4_group_reports(access_token, property_id, start_date, end_date, metrics, dimension_groups)
+    if start > end:
+        raise HTTPException(status_code=400, detail=f"start_date {start_date} is after end_date {end_date}")
+
+    span_reports = {}
+
+    def fetch_span_reports(span_start, span_end):
+        if (span_start, span_end) not in span_reports:
+            span_reports[(span_start, span_end)] = asyncio.ensure_future(fetch_ga4_group_reports(
+                access_token, property_id, span_start.isoformat(), span_end.isoformat(), metrics, dimension_groups,
+                chunk_semaphore
+            ))
+        return span_reports[(span_start, span_end)]
+
+    async def fetch_group(index, dimensions):
+        date_index = dimensions.index("date")
+
+        async def fetch_span(span_start, span_end):
+            report = (await fetch_span_reports(span_start, span_end))[index]
+            rows_by_day = {day.isoformat(): [] for day in days_between(span_start, span_end)}
+            for row in report.get("rows", []):
+                value = row["dimensionValues"][date_index]["value"]  # YYYYMMDD
+                rows_by_day.setdefault(f"{value[:4]}-{value[4:6]}-{value[6:]}", []).append(row)
+            return {key: value for key, value in report.items() if key not in ("rows", "rowCount")}, rows_by_day
+
+        report_headers, rows_by_day = await fetch_with_facts(
+            "ga4", property_id, variant_key(user=user_scope, metrics=metrics, dimensions=dimensions),
+            start, end, fetch_span, read_facts=read_facts
+        )
+
+        report = dict(report_headers or {})
+        rows = [row for day in sorted(rows_by_day) for row in rows_by_day[day]]
+        if rows:
+            report["rows"] = rows
+        report["rowCount"] = len(rows)
+        return report
 
-def get_combined_ga4_analytics_auto(request: Request, start_date: str, end_date: str, has_admin_access: bool):
-    """Automatically retrieve GA4 analytics without requiring property_id"""
-    token_info = refresh_google_token_if_needed(request)
+    try:
+        return await asyncio.gather(*(fetch_group(index, dimensions) for index, dimensions in enumerate(dimension_groups)))
+    finally:
+        for task in span_reports.values():
+            if not task.done():
+                task.cancel()
+
+async def fetch_ga4_planned_report(access_token: str, property_id: str, user_scope: str, start_date: str, end_date: str,
+                                  metrics: list, dimensions: list, read_facts: bool = True, chunk_by_month: bool = False):
+    """
+    Fetch a GA4 report whose field set may exceed the per-request limits. Dimensions are split into
+    groups sharing the date key; the first group is returned as the report and the others are attached
+    under "additionalReports". All groups are fetched together, so their metric and dimension sub-queries
+    share batchRunReports calls (GA4_MAX_BATCH_REQUESTS per call), through the fact store / month chunking as usual.
+    """
+    chunk_semaphore = asyncio.Semaphore(RANGE_CHUNK_CONCURRENCY) if chunk_by_month else None
+    dimension_groups = split_ga4_dimensions(dimensions)
+
+    if FACT_STORE_ENABLED and "date" in dimensions:
+        reports = await fetch_ga4_reports_with_facts(access_token, property_id, user_scope, start_date, end_date, metrics,
+                                                     dimension_groups, read_facts=read_facts, chunk_semaphore=chunk_semaphore)
+    else:
+        reports = await fetch_ga4_group_reports(access_token, property_id, start_date, end_date, metrics, dimension_groups,
+                                                chunk_semaphore)
+    report = reports[0]
+    if len(reports) > 1:
+        report["additionalReports"] = list(reports[1:])
+    return report
+
+async def run_ga4_report(access_token: str, property_id: str, user_scope: str, start_date: str, end_date: str,
+                         has_admin_access: bool, bypass_cache: bool = False, invalidate_cache: bool = False, chunk_by_month: bool = False,
+                         strict_fields: bool = False, raw: bool = False):
+    """
+    Run (or serve from cache) the GA4 runReport for a property, date range and access level.
+    The cache is scoped to user_scope: a cached report is only served to the user whose token fetched it.
+    raw returns the report as JSON bytes: cached bytes are forwarded without being decoded.
+    """
+    metrics, dimensions = get_ga4_fields(has_admin_access)
+    metrics, dimensions, dropped = await validate_ga4_fields(access_token, property_id, user_scope, metrics, dimensions, strict_fields)
+
+    async def fetch():
+        return await fetch_ga4_planned_report(access_token, property_id, user_scope, start_date, end_date, metrics, dimensions,
+                                              read_facts=not (bypass_cache or invalidate_cache),
+                                              chunk_by_month=chunk_by_month)
+
+    cache_key = make_cache_key(
+        "ga4_report",
+        user=user_scope,
+        property_id=property_id,
+        start_date=normalize_date(start_date),
+        end_date=normalize_date(end_date),
+        metrics=metrics,
+        dimensions=dimensions,
+        has_admin_access=has_admin_access
+    )
+    ttl = ttl_for_date_range(start_date, end_date)
+    if raw:
+        async def fetch_bytes():
+            return dumps_json(await fetch())
+
+        payload = await cached_call_bytes(cache_key, ttl, fetch_bytes, bypass_cache=bypass_cache, invalidate_cache=invalidate_cache)
+        return add_json_field(payload, "droppedFields", dropped) if dropped else payload
+
+    report = await cached_call(cache_key, ttl, fetch, bypass_cache=bypass_cache, invalidate_cache=invalidate_cache)
+    if dropped:
+        report["droppedFields"] = dropped
+    return report
+
+async def stream_ga4_report(access_token: str, property_id: str, user_scope: str, start_date: str, end_date: str,
+                            has_admin_access: bool, strict_fields: bool = False):
+    """
+    Stream a GA4 report as NDJSON: the first line holds the report headers and metadata (everything
+    except rows), each following line is one row. Only one page is held in memory at a time.
+    """
+    metrics, dimensions = get_ga4_fields(has_admin_access)
+    metrics, dimensions, dropped = await validate_ga4_fields(access_token, property_id, user_scope, metrics, dimensions, strict_fields)
+    header_extra = {"droppedFields": dropped} if dropped else {}
+
+    if needs_ga4_plan(metrics, dimensions):
+        # Split sub-queries have to be joined before any row is final, so the report is built first
+        report = await fetch_ga4_planned_report(access_token, property_id, user_scope, start_date, end_date, metrics, dimensions)
+        yield json.dumps({**{key: value for key, value in report.items() if key != "rows"}, **header_extra}) + "\n"
+        for row in report.get("rows", []):
+            yield json.dumps(row) + "\n"
+        return
+
+    request_body = build_ga4_request_body(start_date, end_date, metrics, dimensions)
+    first_page = True
+    async for page in iter_ga4_report_pages(access_token, property_id, request_body, page_size=GA4_STREAM_PAGE_SIZE):
+        if first_page:
+            yield json.dumps({**{key: value for key, value in page.items() if key != "rows"}, **header_extra}) + "\n"
+            first_page = False
+        for row in page.get("rows", []):
+            yield json.dumps(row) + "\n"
+
+def apply_ga4_aggregation(report: dict, aggregation: dict = None):
+    """Aggregate a GA4 report server-side when aggregation parameters were given"""
+    if not aggregation:
+        return report
+    try:
+        aggregated = aggregate_ga4_report(report, aggregation)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if report.get("droppedFields"):
+        aggregated["droppedFields"] = report["droppedFields"]
+    return aggregated
+
+@instrumented("ga4.combined_analytics")
+async def get_combined_ga4_analytics(request: Request, property_id: str, start_date: str, end_date: str, has_admin_access: bool,
+                                     bypass_cache: bool = False, invalidate_cache: bool = False, aggregation: dict = None,
+                                     chunk_by_month: bool = False, strict_fields: bool = False,
+                                     raw: bool = False):
+    """
+    Retrieve GA4 analytics with available metrics based on user permissions.
+    raw returns JSON bytes, passed straight through from the cache when no aggregation is requested.
+    """
+    token_info = await refresh_google_token_if_needed(request)
     access_token = token_info.get("token")
 
-    # Fetch the authenticated user's GA4 property ID automatically
-    url_property = "https://analyticsadmin.googleapis.com/v1beta/accountSummaries"
-    headers = {"Authorization": f"Bearer {access_token}"}
-
-    property_response = requests.get(url_property, headers=headers)
-
-    if property_response.status_code != 200:
-        raise HTTPException(status_code=400, detail="Failed to fetch GA4 property ID")
+    report = await run_ga4_report(access_token, property_id, google_user_scope(token_info), start_date, end_date, has_admin_access,
+                                  bypass_cache=bypass_cache, invalidate_cache=invalidate_cache,
+                                  chunk_by_month=chunk_by_month, strict_fields=strict_fields,
+                                  raw=raw and not aggregation)
+    if raw and not aggregation:
+        return report  # Passthrough: cached JSON bytes, never decoded
+    report = apply_ga4_aggregation(report, aggregation)
+    return dumps_json(report) if raw else report
+
+@instrumented("ga4.combined_analytics_auto")
+async def get_combined_ga4_analytics_auto(request: Request, start_date: str, end_date: str, has_admin_access: bool,
+                                          bypass_cache: bool = False, invalidate_cache: bool = False,
+                                          refresh_discovery: bool = False, aggregation: dict = None,
+                                          chunk_by_month: bool = False, strict_fields: bool = False,
+                                          raw: bool = False):
+    """Automatically retrieve GA4 analytics without requiring property_id (raw as in get_combined_ga4_analytics)"""
+    token_info = await refresh_google_token_if_needed(request)
+    access_token = token_info.get("token")
 
-    account_summaries = property_response.json()
-    property_id = account_summaries.get("accountSummaries", [{}])[0].get("propertySummaries", [{}])[0].get("property", None).split("/")[-1]
+    # Look up the authenticated user's GA4 property ID (cached per user)
+    account_summaries = await fetch_discovery(token_info, "account_summaries", GA4_ACCOUNT_SUMMARIES_URL,
+                                              "Failed to fetch GA4 property ID", refresh_discovery)
+    property_name = ((account_summaries.get("accountSummaries") or [{}])[0].get("propertySummaries") or [{}])[0].get("property")
+    property_id = property_name.split("/")[-1] if property_name else None
 
     if not property_id:
         raise HTTPException(status_code=404, detail="No GA4 property ID found")
 
-    # Define metrics based on user permissions
-    viewer_metrics = ["activeUsers", "newUsers", "sessions", "engagedSessions", "screenPageViews", "bounceRate", "engagementRate", "averageSessionDuration", "eventCount"]
-    admin_metrics = ["totalRevenue", "retentionRate", "newVsReturningUsers", "sessionConversionRate", "audienceCategoryAffinity", "sessionQuality"]
-    metrics = viewer_metrics if not has_admin_access else viewer_metrics + admin_metrics
-
-    viewer_dimensions = ["date", "deviceCategory", "country", "city", "browser"]
-    admin_dimensions = ["sessionDefaultChannelGroup", "landingPage", "previousPagePath", "exitPage", "userEngagementDuration", "interests", "videoTitle", "contentType"]
-    dimensions = viewer_dimensions if not has_admin_access else viewer_dimensions + admin_dimensions
-
-    request_body = {
-        "dateRanges": [{"startDate": start_date, "endDate": end_date}],
-        "metrics": [{"name": metric} for metric in metrics],
-        "dimensions": [{"name": dim} for dim in dimensions]
-    }
-
-    url = f"https://analyticsdata.googleapis.com/v1beta/properties/{property_id}:runReport"
-    response = requests.post(url, headers=headers, json=request_body)
-
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail=f"GA4 Analytics request failed: {response.text}")
+    report = await run_ga4_report(access_token, property_id, google_user_scope(token_info), start_date, end_date, has_admin_access,
+                                  bypass_cache=bypass_cache, invalidate_cache=invalidate_cache,
+                                  chunk_by_month=chunk_by_month, strict_fields=strict_fields,
+                                  raw=raw and not aggregation)
+    if raw and not aggregation:
+        return report  # Passthrough: cached JSON bytes, never decoded
+    report = apply_ga4_aggregation(report, aggregation)
+    return dumps_json(report) if raw else report
+
+async def stream_combined_ga4_analytics(request: Request, property_id: str, start_date: str, end_date: str, has_admin_access: bool,
+                                        strict_fields: bool = False):
+    """Stream GA4 analytics rows as NDJSON while pages arrive from the Data API"""
+    token_info = await refresh_google_token_if_needed(request)
+    access_token = token_info.get("token")
 
-    return response.json()
+    async for line in stream_ga4_report(access_token, property_id, google_user_scope(token_info), start_date, end_date,
+                                        has_admin_access, strict_fields):
+        yield line
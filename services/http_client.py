@@ -0,0 +1,82 @@
+import os
+from urllib.parse import urlsplit
+import httpx
+from services.quota_scheduler import schedule_request
+from services.resilience import call_with_resilience
+from services.metrics import observe_upstream
+from dotenv import load_dotenv
+load_dotenv()
+
+# Pool and timeout settings shared by every upstream client
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# Hosts we talk to on almost every request; their pools are opened at startup
+UPSTREAM_HOSTS = [
+    "oauth2.googleapis.com",
+    "www.googleapis.com",
+    "youtubeanalytics.googleapis.com",
+    "analyticsadmin.googleapis.com",
+    "analyticsdata.googleapis.com",
+    "accounts.spotify.com",
+    "api.spotify.com",
+    "graph.facebook.com",
+]
+
+# One keep-alive client (and therefore one connection pool) per upstream host
+_clients = {}
+
+def _create_client():
+    """Build an AsyncClient with the configured timeouts and pool limits"""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_POOL_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+    )
+
+def get_http_client(url: str):
+    """Return the pooled client for the host of the given URL, creating it lazily"""
+    host = urlsplit(url).netloc
+    client = _clients.get(host)
+    if client is None or client.is_closed:
+        client = _create_client()
+        _clients[host] = client
+    return client
+
+async def http_request(method: str, url: str, idempotent: bool = None, **kwargs):
+    """
+    Send a request through the host's pooled client without blocking the event loop.
+    Calls pass the host's circuit breaker (with retries when idempotent, which defaults to the method's
+    semantics) and Google API calls are queued by the quota scheduler. Latency and status are recorded per upstream API.
+    """
+    client = get_http_client(url)
+    return await observe_upstream(method, url, lambda: call_with_resilience(
+        method, url, lambda: schedule_request(method, url, lambda: client.request(method, url, **kwargs)), idempotent
+    ))
+
+async def http_get(url: str, **kwargs):
+    """Async GET over the shared connection pool"""
+    return await http_request("GET", url, **kwargs)
+
+async def http_post(url: str, **kwargs):
+    """Async POST over the shared connection pool"""
+    return await http_request("POST", url, **kwargs)
+
+async def startup_http_clients():
+    """Open the connection pools for the known upstream hosts"""
+    for host in UPSTREAM_HOSTS:
+        get_http_client(f"https://{host}/")
+
+async def shutdown_http_clients():
+    """Close every pooled client and drop its keep-alive connections"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,27 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; the standard library produces the same JSON
+    orjson = None
+
+def dumps_json(value):
+    """Encode a value as compact JSON bytes (orjson when installed)"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+def loads_json(payload):
+    """Decode JSON bytes or text"""
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+def add_json_field(payload: bytes, name: str, value):
+    """Append a top-level field to an encoded JSON object without decoding it"""
+    body = payload.rstrip()
+    if not body.endswith(b"}"):
+        raise ValueError("payload is not a JSON object")
+    body = body[:-1].rstrip()
+    separator = b"" if body.endswith(b"{") else b","
+    return body + separator + dumps_json(name) + b":" + dumps_json(value) + b"}"
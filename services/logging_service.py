@@ -0,0 +1,181 @@
+import os
+import re
+import sys
+import copy
+import json
+import uuid
+import queue
+import atexit
+import logging
+from datetime import datetime, timezone
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from dotenv import load_dotenv
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" for log shippers, "text" for local development
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Records beyond this are dropped rather than blocking
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Dict keys whose values are replaced before a record leaves the process
+REDACTED_KEYS = {
+    "access_token", "refresh_token", "id_token", "token", "client_secret", "code",
+    "authorization", "password", "secret", "jwt_secret", "session_id",
+}
+REDACTED = "[REDACTED]"
+# Secrets embedded in free text: bearer headers, query/form parameters and JSON/repr key-value pairs
+_SECRET_PATTERNS = [
+    re.compile(r"(?i)(bearer\s+)[A-Za-z0-9._~+/=-]+"),
+    re.compile(r"(?i)\b((?:access_token|refresh_token|id_token|client_secret|code)=)[^&\s\"']+"),
+    re.compile(r"(?i)([\"'](?:access_token|refresh_token|id_token|token|client_secret)[\"']\s*:\s*[\"'])[^\"']+"),
+]
+
+# Standard LogRecord attributes; anything else on a record came from `extra` and is emitted as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "correlation_id"}
+
+correlation_id = ContextVar("correlation_id", default=None)
+_listener = None
+
+def redact(value):
+    """Return a copy of value with token fields and embedded secrets masked"""
+    if isinstance(value, dict):
+        return {key: REDACTED if str(key).lower() in REDACTED_KEYS else redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(item) for item in value)
+    if isinstance(value, str):
+        for pattern in _SECRET_PATTERNS:
+            value = pattern.sub(lambda match: match.group(1) + REDACTED, value)
+        return value
+    return value
+
+class RedactionFilter(logging.Filter):
+    """Mask secrets in the message, its arguments and extra fields before the record is queued"""
+
+    def filter(self, record):
+        # Redact the arguments (dicts lose their token fields), then the merged text for embedded secrets
+        if isinstance(record.args, dict):
+            record.args = redact(record.args)
+        elif record.args:
+            record.args = tuple(redact(arg) for arg in record.args)
+        record.msg = redact(record.getMessage())
+        record.args = None
+        for key in set(vars(record)) - _RECORD_ATTRS:
+            setattr(record, key, REDACTED if key.lower() in REDACTED_KEYS else redact(getattr(record, key)))
+        return True
+
+class CorrelationIdFilter(logging.Filter):
+    """Stamp the current request's correlation ID on the record (in the caller's context, before queueing)"""
+
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, correlation ID and any extra fields"""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "correlation_id", None):
+            entry["correlation_id"] = record.correlation_id
+        for key in set(vars(record)) - _RECORD_ATTRS:
+            entry[key] = getattr(record, key)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s")
+
+    def format(self, record):
+        return redact(super().format(record))
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the event loop: records are dropped while the queue is full"""
+
+    def prepare(self, record):
+        """
+        Merge the arguments and render the traceback now, keeping extra fields for the listener's formatter.
+        The traceback and stack are redacted here, since exception messages can carry secrets too.
+        """
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        if record.stack_info:
+            record.stack_info = redact(record.stack_info)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+def setup_logging():
+    """
+    Route all logging through a bounded queue drained by a background listener thread, so log calls never
+    write to stdout on the event loop. Records are redacted and stamped with the correlation ID when queued.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationIdFilter())
+    queue_handler.addFilter(RedactionFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    # httpx logs every request at INFO; upstream calls are already covered by /metrics and Server-Timing
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+class CorrelationIdMiddleware:
+    """ASGI middleware giving every request a correlation ID (taken from X-Request-ID or generated) and echoing it back"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        supplied = headers.get(REQUEST_ID_HEADER.lower().encode(), b"").decode("latin-1")
+        request_id = supplied if re.fullmatch(r"[A-Za-z0-9._-]{1,64}", supplied) else uuid.uuid4().hex
+        token = correlation_id.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            correlation_id.reset(token)
@@ -0,0 +1,226 @@
+import os
+import re
+import time
+import asyncio
+import functools
+from urllib.parse import urlsplit
+from services.cache_service import cache_stats
+from services.resilience import get_breaker_states
+from services.request_timing import record_phase
+from dotenv import load_dotenv
+load_dotenv()
+
+# Histogram bucket upper bounds in seconds (upstream reports routinely take several seconds)
+METRICS_BUCKETS = [float(bound) for bound in os.getenv(
+    "METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60"
+).split(",")]
+
+BREAKER_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+class Metric:
+    """One named metric family; samples are keyed by their label values"""
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.samples = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount: float = 1):
+        self.samples[label_values] = self.samples.get(label_values, 0) + amount
+
+    def render(self):
+        return self.header() + [f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+                                for key, value in self.samples.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values):
+        self.inc(*label_values, amount=-1)
+
+    def set(self, *label_values, value: float):
+        self.samples[label_values] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def observe(self, *label_values, value: float):
+        sample = self.samples.get(label_values)
+        if sample is None:
+            sample = self.samples[label_values] = {"buckets": [0] * len(METRICS_BUCKETS), "sum": 0.0, "count": 0}
+        for index, bound in enumerate(METRICS_BUCKETS):
+            if value <= bound:
+                sample["buckets"][index] += 1
+                break
+        sample["sum"] += value
+        sample["count"] += 1
+
+    def render(self):
+        lines = self.header()
+        for key, sample in self.samples.items():
+            cumulative = 0
+            for bound, count in zip(METRICS_BUCKETS, sample["buckets"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), key + (format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), key + ('+Inf',))} {sample['count']}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_value(sample['sum'])}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {sample['count']}")
+        return lines
+
+def format_value(value: float):
+    """Prometheus number formatting (integers without a trailing .0)"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def format_labels(names: tuple, values: tuple):
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+UPSTREAM_LATENCY = Histogram("upstream_request_duration_seconds",
+                             "Upstream API call latency including queueing and retries", ("api", "operation"))
+UPSTREAM_RESPONSES = Counter("upstream_responses_total", "Upstream API responses by status code (or error type)",
+                             ("api", "operation", "status"))
+UPSTREAM_IN_FLIGHT = Gauge("upstream_requests_in_flight", "Upstream API calls currently in flight", ("api",))
+SERVICE_LATENCY = Histogram("service_call_duration_seconds", "Service function latency", ("operation", "outcome"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "API request latency per route", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "API requests currently being handled")
+
+METRICS = [UPSTREAM_LATENCY, UPSTREAM_RESPONSES, UPSTREAM_IN_FLIGHT, SERVICE_LATENCY, HTTP_LATENCY, HTTP_IN_FLIGHT]
+
+# Path segments that are IDs rather than operation names (Spotify/Graph object IDs, GA4 property paths)
+_ID_SEGMENT = re.compile(r"^(\d+|[A-Za-z0-9]{22}|properties)$")
+
+def classify_upstream(method: str, url: str):
+    """Map an upstream URL to a low-cardinality (api, operation) pair"""
+    parts = urlsplit(url)
+    host, path = parts.netloc, parts.path
+    if host == "analyticsdata.googleapis.com":
+        operation = path.rsplit(":", 1)[-1] if ":" in path else path.rsplit("/", 1)[-1]
+        return "ga4", operation
+    if host == "analyticsadmin.googleapis.com":
+        segments = [segment for segment in path.split("/")[2:] if segment and not _ID_SEGMENT.match(segment)]
+        return "ga4_admin", segments[-1] if segments else "other"
+    if host == "youtubeanalytics.googleapis.com":
+        return "youtube_analytics", "reports"
+    if host == "www.googleapis.com" and path.startswith("/youtube/"):
+        return "youtube_data", path.rstrip("/").rsplit("/", 1)[-1]
+    if host == "openidconnect.googleapis.com":
+        return "oauth", "google_userinfo"
+    if host in ("oauth2.googleapis.com", "accounts.spotify.com") or path.endswith("/oauth/access_token"):
+        return "oauth", {"oauth2.googleapis.com": "google_token", "accounts.spotify.com": "spotify_token"}.get(host, "facebook_token")
+    if host == "api.spotify.com":
+        segments = [segment for segment in path.split("/")[2:] if segment and not _ID_SEGMENT.match(segment)]
+        return "spotify", "/".join(segments[:2]) or "other"
+    if host == "graph.facebook.com":
+        segments = [segment for segment in path.split("/")[2:] if segment and not _ID_SEGMENT.match(segment)]
+        if not segments and method.upper() == "POST":
+            return "graph", "batch"
+        return "graph", segments[-1] if segments else "node"
+    return host or "unknown", "other"
+
+async def observe_upstream(method: str, url: str, call):
+    """Await call() and record its latency, status code and in-flight count under the URL's (api, operation)"""
+    api, operation = classify_upstream(method, url)
+    UPSTREAM_IN_FLIGHT.inc(api)
+    started = time.perf_counter()
+    status = "error"
+    try:
+        response = await call()
+        status = str(response.status_code)
+        return response
+    except Exception as e:
+        status = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_IN_FLIGHT.dec(api)
+        UPSTREAM_LATENCY.observe(api, operation, value=elapsed)
+        record_phase(f"{api}.{operation}", elapsed)
+        UPSTREAM_RESPONSES.inc(api, operation, status)
+
+def instrumented(operation: str):
+    """
+    Decorator recording an async service function's latency and outcome (also as a Server-Timing phase);
+    the result is passed through unchanged
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                SERVICE_LATENCY.observe(operation, outcome, value=elapsed)
+                record_phase(operation, elapsed)
+        return wrapper
+    return decorator
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template (not the raw path, to bound cardinality)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_LATENCY.observe(scope["method"], route.path if route is not None else "unmatched", str(status["code"]),
+                                 value=time.perf_counter() - started)
+
+def cache_metric_lines():
+    """Cache counters and hit ratios per namespace, read from the cache service at scrape time"""
+    lookups = Counter("cache_operations_total", "Response cache operations per namespace", ("namespace", "result"))
+    ratio = Gauge("cache_hit_ratio", "Response cache hit ratio per namespace", ("namespace",))
+    for namespace, counters in cache_stats()["namespaces"].items():
+        for result in ("hits", "misses", "sets", "invalidations", "errors", "stale"):
+            lookups.inc(namespace, result, amount=counters[result])
+        if counters["hit_ratio"] is not None:
+            ratio.set(namespace, value=counters["hit_ratio"])
+    return lookups.render() + ratio.render()
+
+def breaker_metric_lines():
+    """Circuit breaker state per upstream host (0 closed, 1 half open, 2 open)"""
+    state = Gauge("upstream_breaker_state", "Circuit breaker state per host (0 closed, 1 half open, 2 open)", ("host",))
+    for host, snapshot in get_breaker_states().items():
+        state.set(host, value=BREAKER_STATE_VALUES[snapshot["state"]])
+    return state.render()
+
+def render_metrics():
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(cache_metric_lines())
+    lines.extend(breaker_metric_lines())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,127 @@
+import os
+from datetime import datetime
+from urllib.parse import urlencode
+from fastapi import HTTPException
+from services.http_client import http_get, http_post
+from dotenv import load_dotenv
+load_dotenv()
+
+GOOGLE_SCOPES = [
+    "openid",  # Stable account ID (OpenID subject), used to scope caches and prefetch per account
+    "https://www.googleapis.com/auth/analytics.readonly",
+    "https://www.googleapis.com/auth/analytics",
+    "https://www.googleapis.com/auth/analytics.edit",
+    "https://www.googleapis.com/auth/analytics.manage.users",  # Manage users (if needed)
+    "https://www.googleapis.com/auth/analytics.manage.users.readonly",  # Read user access levels
+    "https://www.googleapis.com/auth/analytics.provision",  # Admin access to GA accounts
+    "https://www.googleapis.com/auth/youtube",
+    "https://www.googleapis.com/auth/yt-analytics-monetary.readonly",
+    "https://www.googleapis.com/auth/youtube.readonly",
+    "https://www.googleapis.com/auth/yt-analytics.readonly",
+    "https://www.googleapis.com/auth/youtube.force-ssl",
+    "https://www.googleapis.com/auth/youtubepartner",
+    "https://www.googleapis.com/auth/youtube.channel-memberships.creator"
+]
+SPOTIFY_SCOPES = ["user-follow-read", "user-read-email", "user-top-read", "playlist-read-private", "playlist-read-collaborative"]
+FACEBOOK_SCOPES = ["pages_read_engagement"]
+
+class OAuthProvider:
+    """Client config, prebuilt authorization URL and async token endpoint calls for one OAuth provider"""
+
+    def __init__(self, name: str, token_key: str, client_id: str, client_secret: str, redirect_uri: str,
+                 authorize_url: str, token_url: str, scopes: list, scope_separator: str = " ",
+                 authorize_params: dict = None, token_method: str = "POST", supports_refresh: bool = True):
+        self.name = name
+        self.token_key = token_key
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.token_url = token_url
+        self.token_method = token_method
+        self.supports_refresh = supports_refresh
+        # The authorization URL never changes between logins, so it is built once
+        self.authorization_url = f"{authorize_url}?" + urlencode({
+            "client_id": client_id or "",
+            "redirect_uri": redirect_uri,
+            "response_type": "code",
+            "scope": scope_separator.join(scopes),
+            **(authorize_params or {})
+        })
+
+    def normalize_token(self, token_info: dict):
+        """Add an absolute expires_at (naive-UTC timestamp basis, as the refresh checks use)"""
+        if token_info.get("expires_in"):
+            token_info["expires_at"] = datetime.utcnow().timestamp() + token_info["expires_in"]
+        return token_info
+
+    async def request_token(self, params: dict, idempotent: bool = False):
+        """Call the token endpoint over the pooled client (only retried when the grant can be replayed)"""
+        params = {"client_id": self.client_id, "client_secret": self.client_secret, **params}
+        if self.token_method == "GET":
+            response = await http_get(self.token_url, params=params, idempotent=idempotent)
+        else:
+            response = await http_post(self.token_url, data=params, idempotent=idempotent)
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail=f"{self.name.title()} token request failed: {response.text}")
+        return self.normalize_token(response.json())
+
+    async def exchange_code(self, code: str):
+        """Exchange an authorization code for tokens (authorization codes are single-use, so never retried)"""
+        return await self.request_token({
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": self.redirect_uri
+        })
+
+    async def refresh(self, refresh_token: str):
+        """Get a new access token for a refresh token"""
+        if not self.supports_refresh:
+            raise HTTPException(status_code=401, detail=f"{self.name.title()} tokens cannot be refreshed")
+        try:
+            return await self.request_token({"grant_type": "refresh_token", "refresh_token": refresh_token}, idempotent=True)
+        except HTTPException as e:
+            raise HTTPException(status_code=401, detail=f"Failed to refresh {self.name.title()} token: {e.detail}")
+
+class GoogleOAuthProvider(OAuthProvider):
+    """Google tokens also carry the credentials-JSON keys (token, expiry) the Google services read"""
+
+    def normalize_token(self, token_info: dict):
+        token_info = super().normalize_token(token_info)
+        if token_info.get("access_token"):
+            token_info["token"] = token_info["access_token"]
+        if token_info.get("expires_at"):
+            token_info["expiry"] = datetime.fromtimestamp(token_info["expires_at"]).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        return token_info
+
+def build_oauth_providers():
+    """Build every provider's client config and authorization URL from the environment"""
+    return {
+        "google": GoogleOAuthProvider(
+            "google", "google_token_info",
+            os.getenv("GOOGLE_CLIENT_ID"), os.getenv("GOOGLE_CLIENT_SECRET"),
+            os.getenv("REDIRECT_URI", "https://f0k0kw0go4g0ko4o0gggoscw.vps.boomlive.in/auth/callback/google"),
+            "https://accounts.google.com/o/oauth2/auth", "https://oauth2.googleapis.com/token",
+            GOOGLE_SCOPES,
+            authorize_params={"access_type": "offline", "include_granted_scopes": "true", "prompt": "consent"}
+        ),
+        "spotify": OAuthProvider(
+            "spotify", "spotify_token_info",
+            os.getenv("SPOTIFY_CLIENT_ID"), os.getenv("SPOTIFY_CLIENT_SECRET"),
+            os.getenv("SPOTIFY_REDIRECT_URI", "https://f0k0kw0go4g0ko4o0gggoscw.vps.boomlive.in/auth/callback/spotify"),
+            "https://accounts.spotify.com/authorize", "https://accounts.spotify.com/api/token",
+            SPOTIFY_SCOPES
+        ),
+        "facebook": OAuthProvider(
+            "facebook", "facebook_token_info",
+            os.getenv("FACEBOOK_APP_ID"), os.getenv("FACEBOOK_APP_SECRET"),
+            os.getenv("FACEBOOK_REDIRECT_URI", "https://ba9a-58-146-101-17.ngrok-free.app/auth/callback/facebook"),
+            "https://www.facebook.com/v18.0/dialog/oauth", "https://graph.facebook.com/v18.0/oauth/access_token",
+            FACEBOOK_SCOPES, scope_separator=",", token_method="GET", supports_refresh=False
+        ),
+    }
+
+OAUTH_PROVIDERS = build_oauth_providers()
+
+def get_oauth_provider(name: str):
+    """Return the registered provider by name"""
+    return OAUTH_PROVIDERS[name]
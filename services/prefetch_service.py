@@ -0,0 +1,137 @@
+import os
+import time
+import random
+import logging
+import asyncio
+from datetime import date, timedelta
+from starlette.requests import Request
+from services.token_service import GOOGLE_TOKEN_KEY, SESSION_ID_KEY, BACKGROUND_REQUEST_KEY, is_account_session
+from services.token_store import (
+    LAST_ACTIVE_KEY, SESSION_IDLE_TIMEOUT, iter_stored_sessions, save_session_tokens, delete_session_tokens
+)
+from services.quota_scheduler import PRIORITY_BACKGROUND, request_priority
+from services.fact_store import prune_facts
+from services.google_service import get_combined_ga4_analytics_auto, get_combined_youtube_analytics_auto
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_INTERVAL = int(os.getenv("PREFETCH_INTERVAL", "3600"))  # Seconds between warm-up passes
+PREFETCH_INITIAL_DELAY = int(os.getenv("PREFETCH_INITIAL_DELAY", "60"))  # Let startup traffic settle first
+PREFETCH_JITTER = float(os.getenv("PREFETCH_JITTER", "30"))  # Random delay spread over jobs and passes
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))  # Reports warmed at once
+PREFETCH_RANGES = [int(days) for days in os.getenv("PREFETCH_RANGES", "7,28,90").split(",") if days.strip()]
+PREFETCH_ACCOUNT_IDLE = int(os.getenv("PREFETCH_ACCOUNT_IDLE", str(7 * 86400)))  # Accounts unused this long are not warmed
+
+_task = None
+_stats = {"passes": 0, "accounts": 0, "idle_sessions_dropped": 0, "facts_pruned": 0, "jobs": 0, "failures": 0,
+          "last_pass_at": None, "last_pass_seconds": None}
+
+def prefetch_ranges():
+    """(start_date, end_date) pairs for the last N days, ending yesterday so they cache as historical"""
+    yesterday = date.today() - timedelta(days=1)
+    return [((yesterday - timedelta(days=days - 1)).isoformat(), yesterday.isoformat()) for days in PREFETCH_RANGES]
+
+async def google_accounts():
+    """
+    Token-store IDs of the Google accounts to warm: per-account credentials (kept across logins, so the
+    next morning's session hits what was prefetched) used within PREFETCH_ACCOUNT_IDLE. Browser sessions
+    idle for longer than the cookie lifetime can no longer be used by anyone, so they are dropped.
+    """
+    now = time.time()
+    accounts = []
+    async for sid, tokens in iter_stored_sessions():
+        if is_account_session(sid):
+            if ((tokens.get(GOOGLE_TOKEN_KEY) or {}).get("refresh_token")
+                    and tokens.get(LAST_ACTIVE_KEY, 0) + PREFETCH_ACCOUNT_IDLE > now):
+                accounts.append(sid)
+            continue
+        last_active = tokens.get(LAST_ACTIVE_KEY)
+        if last_active is None:
+            # Stored before activity was tracked: start the idle clock now, without extending the session
+            tokens[LAST_ACTIVE_KEY] = last_active = now
+            await save_session_tokens(sid, tokens, keep_expiry=True)
+        if last_active + SESSION_IDLE_TIMEOUT <= now:
+            await delete_session_tokens(sid)
+            _stats["idle_sessions_dropped"] += 1
+    return accounts
+
+def session_request(sid: str):
+    """A minimal request carrying a stored token-store ID, so the regular service functions can run for it"""
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [], "session": {SESSION_ID_KEY: sid},
+                    BACKGROUND_REQUEST_KEY: True})
+
+async def run_prefetch_job(semaphore: asyncio.Semaphore, name: str, fetch):
+    """Run one warm-up call after a random delay; failures are counted, never raised"""
+    # Each job runs in its own task, so this only lowers the priority of the warm-up's Google calls
+    request_priority.set(PRIORITY_BACKGROUND)
+    await asyncio.sleep(random.uniform(0, PREFETCH_JITTER))
+    async with semaphore:
+        try:
+            await fetch()
+            _stats["jobs"] += 1
+        except Exception as e:
+            _stats["failures"] += 1
+            logger.warning("Prefetch %s failed: %s", name, e)
+
+async def prefetch_pass():
+    """Warm the auto GA4 and YouTube reports for every recently used Google account and standard range"""
+    started = time.time()
+    accounts = await google_accounts()
+    semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+    jobs = []
+    for sid in accounts:
+        request = session_request(sid)
+        for start_date, end_date in prefetch_ranges():
+            jobs.append(run_prefetch_job(
+                semaphore, f"ga4 {start_date}..{end_date}",
+                lambda request=request, start_date=start_date, end_date=end_date:
+                    get_combined_ga4_analytics_auto(request, start_date, end_date, has_admin_access=False)
+            ))
+            jobs.append(run_prefetch_job(
+                semaphore, f"youtube {start_date}..{end_date}",
+                lambda request=request, start_date=start_date, end_date=end_date:
+                    get_combined_youtube_analytics_auto(request, start_date, end_date)
+            ))
+    await asyncio.gather(*jobs)
+    _stats["facts_pruned"] += await prune_facts()
+
+    _stats["passes"] += 1
+    _stats["accounts"] = len(accounts)
+    _stats["last_pass_at"] = started
+    _stats["last_pass_seconds"] = round(time.time() - started, 3)
+
+async def prefetch_loop():
+    """Run warm-up passes forever, PREFETCH_INTERVAL (plus jitter) apart"""
+    await asyncio.sleep(PREFETCH_INITIAL_DELAY)
+    while True:
+        try:
+            await prefetch_pass()
+        except Exception as e:
+            logger.exception("Prefetch pass failed")
+        await asyncio.sleep(PREFETCH_INTERVAL + random.uniform(0, PREFETCH_JITTER))
+
+def start_prefetch_scheduler():
+    """Start the background prefetch loop (no-op when disabled)"""
+    global _task
+    if PREFETCH_ENABLED and _task is None:
+        _task = asyncio.create_task(prefetch_loop())
+
+async def stop_prefetch_scheduler():
+    """Cancel the background prefetch loop and wait for it to finish"""
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+
+def get_prefetch_stats():
+    """Counters for the background warm-up passes"""
+    return {**_stats, "enabled": PREFETCH_ENABLED, "running": _task is not None and not _task.done()}
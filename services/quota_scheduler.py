@@ -0,0 +1,305 @@
+import os
+import re
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import contextvars
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from fastapi import HTTPException
+from dotenv import load_dotenv
+load_dotenv()
+
+QUOTA_PROJECT_CONCURRENCY = int(os.getenv("QUOTA_PROJECT_CONCURRENCY", "20"))  # In-flight calls per Google API
+QUOTA_PROPERTY_CONCURRENCY = int(os.getenv("QUOTA_PROPERTY_CONCURRENCY", "10"))  # GA4 concurrent requests per property
+QUOTA_RESERVE = float(os.getenv("QUOTA_RESERVE", "0.2"))  # Share of remaining quota kept for interactive requests
+QUOTA_YOUTUBE_DAILY_UNITS = int(os.getenv("QUOTA_YOUTUBE_DAILY_UNITS", "10000"))  # YouTube Data API units per day
+QUOTA_YOUTUBE_ANALYTICS_DAILY_UNITS = int(os.getenv("QUOTA_YOUTUBE_ANALYTICS_DAILY_UNITS", "50000"))  # YouTube Analytics queries per day
+QUOTA_MAX_RETRIES = int(os.getenv("QUOTA_MAX_RETRIES", "3"))  # Retries after a 429
+QUOTA_BACKOFF_BASE = float(os.getenv("QUOTA_BACKOFF_BASE", "1"))  # Seconds, doubled per retry
+QUOTA_MAX_BACKOFF = float(os.getenv("QUOTA_MAX_BACKOFF", "60"))
+QUOTA_SNAPSHOT_TTL = 3600  # GA4 hourly quotas reset, so older propertyQuota feedback is ignored
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")  # Google's daily quotas reset at midnight Pacific time
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# Priority of the Google calls made by the current task (background jobs set it to PRIORITY_BACKGROUND)
+request_priority = contextvars.ContextVar("request_priority", default=PRIORITY_INTERACTIVE)
+
+# Google API hosts whose calls count against project quota
+QUOTA_PROJECTS = {
+    "analyticsdata.googleapis.com": "ga4",
+    "analyticsadmin.googleapis.com": "ga4_admin",
+    "youtubeanalytics.googleapis.com": "youtube_analytics",
+}
+# www.googleapis.com serves several APIs with separate quotas, told apart by path
+QUOTA_PATH_PROJECTS = {
+    "/youtube/v3/": "youtube_data",
+    "/youtube/partner/": "youtube_partner",
+}
+# Daily unit budgets, for the APIs whose quota is counted in units
+QUOTA_DAILY_UNITS = {
+    "youtube_data": QUOTA_YOUTUBE_DAILY_UNITS,
+    "youtube_analytics": QUOTA_YOUTUBE_ANALYTICS_DAILY_UNITS,
+}
+GA4_PROPERTY_PATTERN = re.compile(r"/properties/(\d+)")
+
+class PriorityLimiter:
+    """Concurrency limiter that hands a freed slot to the highest-priority waiter first"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    @property
+    def waiting(self):
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: int):
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation landed
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def _hand_over(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # The slot passes straight to the waiter
+                return True
+        return False
+
+    def release(self):
+        # Slots above a lowered limit are retired instead of handed over
+        if self.active > self.limit or not self._hand_over():
+            self.active -= 1
+
+    def set_limit(self, limit: int):
+        """Change the concurrency limit, admitting waiters straight away when it grows"""
+        self.limit = limit
+        while self.active < self.limit and self._hand_over():
+            self.active += 1
+
+_limiters = {}
+_cooldowns = {}
+_property_quota = {}
+_daily_units = {}
+_stats = {"scheduled": 0, "retries_429": 0, "failed_429": 0, "background_refused": 0, "interactive_refused": 0}
+
+def quota_project(url: str):
+    """Quota project of a Google API URL, or None for calls that are not quota-limited"""
+    parts = urlsplit(url)
+    if parts.netloc == "www.googleapis.com":
+        return next((project for prefix, project in QUOTA_PATH_PROJECTS.items() if parts.path.startswith(prefix)), None)
+    return QUOTA_PROJECTS.get(parts.netloc)
+
+def quota_units(project: str, method: str, url: str):
+    """
+    Units one call costs against its project's daily budget. YouTube Data API reads cost 1, search.list 100
+    and writes 50; each YouTube Analytics query costs 1.
+    """
+    if project == "youtube_data":
+        if urlsplit(url).path.rstrip("/").endswith("/search"):
+            return 100
+        return 1 if method == "GET" else 50
+    return 1
+
+def quota_keys(url: str):
+    """Limiter keys a Google API call counts against: its project and, for GA4, its property"""
+    project = quota_project(url)
+    if project is None:
+        return []
+    keys = [f"project:{project}"]
+    match = GA4_PROPERTY_PATTERN.search(url) if project == "ga4" else None
+    if match:
+        keys.append(f"property:{match.group(1)}")
+    return keys
+
+def _limiter(key: str):
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = PriorityLimiter(QUOTA_PROPERTY_CONCURRENCY if key.startswith("property:") else QUOTA_PROJECT_CONCURRENCY)
+        _limiters[key] = limiter
+    return limiter
+
+def _next_quota_reset(daily: bool):
+    """When an hourly (top of the hour) or daily (midnight Pacific) quota next refills"""
+    now = datetime.now(QUOTA_TIMEZONE)
+    if daily:
+        return (now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)).timestamp()
+    return (now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)).timestamp()
+
+def record_property_quota(property_id: str, quota: dict):
+    """
+    Keep the propertyQuota block GA4 returns with returnPropertyQuota for throttling. Once a token quota is
+    used up, every caller of the property is held back until it refills.
+    """
+    if not quota:
+        return
+    property_id = str(property_id)
+    _property_quota[property_id] = (time.time(), quota)
+    for name, daily in (("tokensPerDay", True), ("tokensPerHour", False), ("tokensPerProjectPerHour", False)):
+        status = quota.get(name) or {}
+        if status and status.get("remaining", 0) <= 0:
+            key = f"property:{property_id}"
+            _cooldowns[key] = max(_cooldowns.get(key, 0), _next_quota_reset(daily))
+
+def property_quota_remaining(property_id: str):
+    """Smallest remaining share across the property's token quotas, or None without recent feedback"""
+    snapshot = _property_quota.get(str(property_id))
+    if snapshot is None or snapshot[0] + QUOTA_SNAPSHOT_TTL < time.time():
+        return None
+    shares = []
+    for name in ("tokensPerDay", "tokensPerHour", "tokensPerProjectPerHour"):
+        status = snapshot[1].get(name) or {}
+        total = status.get("consumed", 0) + status.get("remaining", 0)
+        if total:
+            shares.append(status.get("remaining", 0) / total)
+    return min(shares) if shares else None
+
+def property_concurrency(property_id: str):
+    """Per-property concurrency, scaled down towards 1 as the remaining quota drops into the reserve"""
+    remaining = property_quota_remaining(property_id)
+    if remaining is None or remaining >= QUOTA_RESERVE:
+        return QUOTA_PROPERTY_CONCURRENCY
+    return max(1, int(QUOTA_PROPERTY_CONCURRENCY * remaining / QUOTA_RESERVE))
+
+def _units_used(project: str):
+    today = datetime.now(QUOTA_TIMEZONE).date().isoformat()
+    units = _daily_units.get(project)
+    if units is None or units["day"] != today:
+        units = _daily_units[project] = {"day": today, "used": 0}
+    return units["used"]
+
+def _check_background_allowed(keys: list):
+    """Refuse background calls once the remaining quota is down to the interactive reserve"""
+    for key in keys:
+        if key.startswith("property:"):
+            remaining = property_quota_remaining(key.split(":", 1)[1])
+            exhausted = remaining is not None and remaining < QUOTA_RESERVE
+        elif key[len("project:"):] in QUOTA_DAILY_UNITS:
+            project = key[len("project:"):]
+            exhausted = _units_used(project) >= QUOTA_DAILY_UNITS[project] * (1 - QUOTA_RESERVE)
+        else:
+            exhausted = False
+        if exhausted:
+            _stats["background_refused"] += 1
+            raise HTTPException(status_code=429, detail=f"Quota for {key} is reserved for interactive requests")
+
+def retry_after_seconds(response):
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP date), if any"""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+async def _wait_for_cooldown(keys: list):
+    """Hold the call while any of its keys is cooling down; cooldowns longer than QUOTA_MAX_BACKOFF fail fast"""
+    while True:
+        key, until = max(((key, _cooldowns.get(key, 0)) for key in keys), key=lambda item: item[1])
+        delay = until - time.time()
+        if delay <= 0:
+            return
+        if delay > QUOTA_MAX_BACKOFF:
+            _stats["interactive_refused" if request_priority.get() == PRIORITY_INTERACTIVE else "background_refused"] += 1
+            raise HTTPException(status_code=429, detail=f"Quota for {key} is used up until it resets",
+                                headers={"Retry-After": str(int(delay) + 1)})
+        await asyncio.sleep(delay)
+
+async def schedule_request(method: str, url: str, send):
+    """
+    Run send() for a Google API call under the project/property limits, serving interactive callers before
+    background ones, and back off on 429 (honouring Retry-After) instead of failing straight away.
+    Calls are charged against their API's daily unit budget, and a GA4 property running low on tokens
+    gets less concurrency for every caller.
+    """
+    keys = quota_keys(url)
+    if not keys:
+        return await send()
+
+    priority = request_priority.get()
+    if priority != PRIORITY_INTERACTIVE:
+        _check_background_allowed(keys)
+    _stats["scheduled"] += 1
+
+    project = keys[0][len("project:"):]
+    units = quota_units(project, method, url)
+    # Narrowest limiter first, always in the same order, so waiters never deadlock
+    limiters = [_limiter(key) for key in reversed(keys)]
+    for key, limiter in zip(reversed(keys), limiters):
+        if key.startswith("property:"):
+            limiter.set_limit(property_concurrency(key.split(":", 1)[1]))
+    attempt = 0
+    while True:
+        await _wait_for_cooldown(keys)
+        acquired = []
+        try:
+            for limiter in limiters:
+                await limiter.acquire(priority)
+                acquired.append(limiter)
+            response = await send()
+        finally:
+            for limiter in reversed(acquired):
+                limiter.release()
+
+        if project in QUOTA_DAILY_UNITS:
+            _units_used(project)
+            _daily_units[project]["used"] += units
+
+        if response.status_code != 429:
+            return response
+        if attempt >= QUOTA_MAX_RETRIES:
+            _stats["failed_429"] += 1
+            return response
+
+        delay = retry_after_seconds(response)
+        if delay is None:
+            delay = QUOTA_BACKOFF_BASE * 2 ** attempt * random.uniform(0.5, 1.5)
+        delay = min(delay, QUOTA_MAX_BACKOFF)
+        # Hold every caller of the throttled property/project back, not just this one
+        _cooldowns[keys[-1]] = max(_cooldowns.get(keys[-1], 0), time.time() + delay)
+        _stats["retries_429"] += 1
+        attempt += 1
+
+def get_quota_stats():
+    """Limiter occupancy, cooldowns and the latest quota feedback per project and property"""
+    now = time.time()
+    return {
+        **_stats,
+        "limiters": {
+            key: {"active": limiter.active, "waiting": limiter.waiting, "limit": limiter.limit,
+                  "cooldown_seconds": round(max(0.0, _cooldowns.get(key, 0) - now), 3)}
+            for key, limiter in _limiters.items()
+        },
+        "ga4_properties": {
+            property_id: {"remaining_share": property_quota_remaining(property_id), "quota": quota}
+            for property_id, (_, quota) in _property_quota.items()
+        },
+        "daily_units": {
+            project: {"used_today": _units_used(project), "daily_limit": limit}
+            for project, limit in QUOTA_DAILY_UNITS.items()
+        }
+    }
@@ -0,0 +1,121 @@
+from datetime import date, timedelta
+from services.ga4_frame import WEIGHTED_METRICS as GA4_WEIGHTED_METRICS
+
+# YouTube averages re-aggregated as a mean weighted by this metric
+YOUTUBE_WEIGHTED_METRICS = {
+    "averageViewDuration": "views",
+    "averageViewPercentage": "views",
+}
+
+# YouTube share metrics weighted by each chunk's total views (the report cannot carry views itself)
+YOUTUBE_CHUNK_WEIGHTED_METRICS = {"viewerPercentage"}
+
+def month_chunks(start: date, end: date):
+    """Split a date range into calendar-month (start, end) chunks"""
+    chunks = []
+    chunk_start = start
+    while chunk_start <= end:
+        next_month = (chunk_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        chunk_end = min(end, next_month - timedelta(days=1))
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = next_month
+    return chunks
+
+def _format_ga4_value(value: float, integer: bool):
+    return str(int(round(value))) if integer else repr(float(value))
+
+def _weighted_merge(groups: dict, metric_names: list, weighted: dict, chunk_weighted: set = frozenset()):
+    """
+    Re-aggregate metric values that share a dimension key.
+    groups maps key -> list of (metric values, chunk weight); returns key -> merged values.
+    """
+    merged = {}
+    for key, entries in groups.items():
+        if len(entries) == 1:
+            merged[key] = entries[0][0]
+            continue
+        values = []
+        for index, name in enumerate(metric_names):
+            weight_name = weighted.get(name)
+            if weight_name in metric_names:
+                weight_index = metric_names.index(weight_name)
+                weights = [entry[0][weight_index] for entry in entries]
+            elif name in chunk_weighted or weight_name:
+                weights = [entry[1] if entry[1] is not None else 1 for entry in entries]
+            else:
+                values.append(sum(entry[0][index] for entry in entries))
+                continue
+            total_weight = sum(weights)
+            if total_weight:
+                values.append(sum(entry[0][index] * w for entry, w in zip(entries, weights)) / total_weight)
+            else:
+                values.append(sum(entry[0][index] for entry in entries) / len(entries))
+        merged[key] = values
+    return merged
+
+def merge_ga4_reports(reports: list):
+    """
+    Merge runReport responses for adjacent date chunks into one response.
+    Rows sharing all dimension values are re-aggregated: counts are summed and
+    ratio metrics (bounceRate, averageSessionDuration, ...) are weighted by their base metric.
+    """
+    reports = [report for report in reports if report]
+    if not reports:
+        return {}
+    merged = {key: value for key, value in reports[0].items() if key not in ("rows", "rowCount")}
+    metric_headers = merged.get("metricHeaders", [])
+    metric_names = [header["name"] for header in metric_headers]
+
+    groups = {}
+    for report in reports:
+        for row in report.get("rows", []):
+            key = tuple(value.get("value") for value in row.get("dimensionValues", []))
+            values = [float(value.get("value") or 0) for value in row.get("metricValues", [])]
+            groups.setdefault(key, []).append((values, None))
+
+    merged_values = _weighted_merge(groups, metric_names, GA4_WEIGHTED_METRICS)
+    integer_metrics = [header.get("type") == "TYPE_INTEGER" for header in metric_headers]
+    rows = []
+    for key, values in merged_values.items():
+        rows.append({
+            "dimensionValues": [{"value": value} for value in key],
+            "metricValues": [{"value": _format_ga4_value(value, integer)} for value, integer in zip(values, integer_metrics)]
+        })
+    if rows:
+        merged["rows"] = rows
+    merged["rowCount"] = len(rows)
+    return merged
+
+def merge_youtube_reports(reports: list, chunk_weights: list = None, sort_descending: bool = False):
+    """
+    Merge YouTube Analytics responses for adjacent date chunks into one response.
+    Rows sharing dimension values are re-aggregated (averages weighted by views, viewerPercentage
+    weighted by each chunk's total views); rows are ordered by their dimensions.
+    """
+    if not reports:
+        return {}
+    chunk_weights = chunk_weights or [None] * len(reports)
+    merged = {key: value for key, value in reports[0].items() if key != "rows"}
+    columns = merged.get("columnHeaders", [])
+    dimension_indexes = [index for index, column in enumerate(columns) if column.get("columnType") == "DIMENSION"]
+    metric_indexes = [index for index, column in enumerate(columns) if column.get("columnType") != "DIMENSION"]
+    metric_names = [columns[index]["name"] for index in metric_indexes]
+
+    groups = {}
+    for report, weight in zip(reports, chunk_weights):
+        for row in report.get("rows", []):
+            key = tuple(row[index] for index in dimension_indexes)
+            groups.setdefault(key, []).append(([row[index] or 0 for index in metric_indexes], weight))
+
+    merged_values = _weighted_merge(groups, metric_names, YOUTUBE_WEIGHTED_METRICS, YOUTUBE_CHUNK_WEIGHTED_METRICS)
+    integer_metrics = [columns[index].get("dataType") == "INTEGER" for index in metric_indexes]
+    rows = []
+    for key in sorted(merged_values, reverse=sort_descending):
+        row = [None] * len(columns)
+        for index, value in zip(dimension_indexes, key):
+            row[index] = value
+        for index, value, integer in zip(metric_indexes, merged_values[key], integer_metrics):
+            row[index] = int(round(value)) if integer else value
+        rows.append(row)
+    merged["rows"] = rows
+    return merged
@@ -0,0 +1,162 @@
+import os
+import re
+import sys
+import hmac
+import asyncio
+import time
+import secrets
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from cachetools import LRUCache
+from fastapi import Request
+from dotenv import load_dotenv
+load_dotenv()
+
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN")  # Profiling mode is disabled while unset
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))  # Seconds between stack samples
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "50"))  # Most recent profiles kept for retrieval
+PROFILE_TOP_STACKS = 40
+PROFILE_MAX_DEPTH = 64
+
+# Phase name -> [total seconds, calls] for the request being handled. The dict is shared (not copied)
+# with tasks spawned by the request, so phases recorded inside asyncio.gather are counted too.
+_phases = ContextVar("request_phases", default=None)
+_profiles = LRUCache(maxsize=PROFILE_MAX_STORED)
+# Sampler of the profiled request, inherited by the tasks it spawns so they are attributed to it
+_active_sampler = ContextVar("active_sampler", default=None)
+
+def start_request_timing():
+    """Begin collecting phases for the current request"""
+    phases = {}
+    _phases.set(phases)
+    return phases
+
+def record_phase(name: str, seconds: float):
+    """Add a timed phase to the current request (no-op outside a timed request)"""
+    phases = _phases.get()
+    if phases is None:
+        return
+    entry = phases.setdefault(name, [0.0, 0])
+    entry[0] += seconds
+    entry[1] += 1
+
+@contextmanager
+def timed_phase(name: str):
+    """Time the enclosed block as a phase of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started)
+
+def server_timing_header(phases: dict):
+    """Format phases as a Server-Timing header value (durations in milliseconds, call counts in desc)"""
+    entries = []
+    for name, (seconds, calls) in phases.items():
+        entry = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)};dur={seconds * 1000:.1f}"
+        if calls > 1:
+            entry += f';desc="{calls} calls"'
+        entries.append(entry)
+    return ", ".join(entries)
+
+def is_profiling_admin(request: Request):
+    """Whether the request carries the profiling admin token"""
+    supplied = request.headers.get("X-Admin-Token")
+    return bool(PROFILING_ADMIN_TOKEN and supplied and hmac.compare_digest(supplied, PROFILING_ADMIN_TOKEN))
+
+def profiling_requested(request: Request):
+    """Profiling is opt-in per request (X-Profile header or ?profile=true) and admin-only"""
+    flag = request.headers.get("X-Profile") or request.query_params.get("profile") or ""
+    return flag.lower() in ("1", "true") and is_profiling_admin(request)
+
+def _profiling_task_factory(loop, coro, **kwargs):
+    """Task factory registering tasks created while a request is profiled with that request's sampler"""
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    sampler = _active_sampler.get()
+    if sampler is not None:
+        sampler.tasks.add(task)
+    return task
+
+class StackSampler:
+    """
+    Samples the event loop thread's Python stack on a background thread and counts collapsed stacks.
+    Only samples taken while one of the request's own tasks is running are kept; time spent idle or in
+    other requests' tasks is counted separately, so concurrent traffic does not leak into the profile.
+    """
+
+    def __init__(self, loop, thread_id: int):
+        self.loop = loop
+        self.thread_id = thread_id
+        self.tasks = {asyncio.current_task()}
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.other_samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._context_token = None
+
+    def start(self):
+        self._context_token = _active_sampler.set(self)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(PROFILE_SAMPLE_INTERVAL):
+            task = asyncio.current_task(self.loop)
+            frame = sys._current_frames().get(self.thread_id)
+            if task is None:
+                self.idle_samples += 1
+                continue
+            # Drop samples where the loop switched tasks between reading the task and the frame
+            if task not in self.tasks or asyncio.current_task(self.loop) is not task:
+                self.other_samples += 1
+                continue
+            stack = []
+            while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    async def stop(self):
+        """Stop sampling; the sampler thread is joined off the event loop"""
+        self._stop.set()
+        _active_sampler.reset(self._context_token)
+        await asyncio.to_thread(self._thread.join)
+
+def start_profiler(request: Request):
+    """Start sampling for this request when an admin asked for a profile, else return None"""
+    if not profiling_requested(request):
+        return None
+    loop = asyncio.get_running_loop()
+    if loop.get_task_factory() is None:
+        loop.set_task_factory(_profiling_task_factory)
+    return StackSampler(loop, threading.get_ident()).start()
+
+def store_profile(sampler: StackSampler, request: Request, phases: dict, total: float):
+    """Keep the sampled profile for later retrieval and return its ID"""
+    profile_id = secrets.token_hex(8)
+    _profiles[profile_id] = {
+        "profile_id": profile_id,
+        "method": request.method,
+        "path": request.url.path,
+        "recorded_at": time.time(),
+        "total_ms": round(total * 1000, 1),
+        "phases": {name: {"ms": round(seconds * 1000, 1), "calls": calls} for name, (seconds, calls) in phases.items()},
+        "sample_interval_ms": PROFILE_SAMPLE_INTERVAL * 1000,
+        "samples": sampler.samples,
+        "idle_samples": sampler.idle_samples,
+        "other_request_samples": sampler.other_samples,
+        # Collapsed stacks (root first) of this request's tasks only, most frequent first
+        "stacks": [{"stack": stack, "samples": count} for stack, count in sampler.stacks.most_common(PROFILE_TOP_STACKS)]
+    }
+    return profile_id
+
+def get_profile(profile_id: str):
+    """Return a stored profile, or None once it has been evicted"""
+    return _profiles.get(profile_id)
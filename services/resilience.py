@@ -0,0 +1,125 @@
+import os
+import time
+import random
+import asyncio
+from urllib.parse import urlsplit
+import httpx
+from fastapi import HTTPException
+from dotenv import load_dotenv
+load_dotenv()
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))  # Total tries for an idempotent call
+RETRY_BACKOFF_BASE = float(os.getenv("RETRY_BACKOFF_BASE", "0.2"))  # Seconds, doubled per retry, full jitter
+RETRY_MAX_BACKOFF = float(os.getenv("RETRY_MAX_BACKOFF", "2"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))  # Consecutive failures that open a breaker
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))  # Seconds before a probe call is let through
+
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+class UpstreamUnavailable(HTTPException):
+    """The upstream host is unhealthy (breaker open or unreachable); callers may fall back to stale data"""
+
+    def __init__(self, host: str, detail: str):
+        super().__init__(status_code=503, detail=f"{host} is unavailable: {detail}")
+        self.host = host
+
+class CircuitBreaker:
+    """Per-host breaker: opens after consecutive failures, lets one probe through after the reset timeout"""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.stats = {"successes": 0, "failures": 0, "rejected": 0, "retries": 0, "opened": 0}
+
+    def allow(self):
+        if self.state == "open" and time.time() - self.opened_at >= BREAKER_RESET_TIMEOUT:
+            self.state = "half_open"
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def record_success(self):
+        self.stats["successes"] += 1
+        self.state, self.failures, self.opened_at, self.probing = "closed", 0, None, False
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self.failures += 1
+        self.probing = False
+        if self.state == "half_open" or self.failures >= BREAKER_FAILURE_THRESHOLD:
+            if self.state != "open":
+                self.stats["opened"] += 1
+            self.state, self.opened_at = "open", time.time()
+
+    def release_probe(self):
+        """The call let through ended without an outcome; a half-open breaker re-opens and retries after the timeout"""
+        if self.state == "half_open" and self.probing:
+            self.probing = False
+            self.state, self.opened_at = "open", time.time()
+
+    def snapshot(self):
+        retry_in = None
+        if self.state == "open":
+            retry_in = round(max(0.0, self.opened_at + BREAKER_RESET_TIMEOUT - time.time()), 3)
+        return {"state": self.state, "consecutive_failures": self.failures, "retry_in_seconds": retry_in, **self.stats}
+
+_breakers = {}
+
+def get_breaker(url: str):
+    """Return the circuit breaker for the host of the given URL"""
+    host = urlsplit(url).netloc
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = CircuitBreaker(host)
+        _breakers[host] = breaker
+    return breaker
+
+def backoff_delay(attempt: int):
+    """Full-jitter exponential backoff for the given retry number (0-based)"""
+    return random.uniform(0, min(RETRY_MAX_BACKOFF, RETRY_BACKOFF_BASE * 2 ** attempt))
+
+async def call_with_resilience(method: str, url: str, send, idempotent: bool = None):
+    """
+    Run send() behind the host's circuit breaker. Idempotent calls are retried with jittered backoff
+    on connection errors and 5xx; while the breaker is open calls fail fast with UpstreamUnavailable.
+    """
+    breaker = get_breaker(url)
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    attempts = RETRY_MAX_ATTEMPTS if idempotent else 1
+
+    for attempt in range(attempts):
+        if not breaker.allow():
+            raise UpstreamUnavailable(breaker.host, "circuit breaker is open")
+        try:
+            response = await send()
+        except httpx.TransportError as e:
+            breaker.record_failure()
+            if attempt + 1 >= attempts:
+                raise UpstreamUnavailable(breaker.host, f"{type(e).__name__}: {e}")
+        except BaseException:
+            # Cancellation (e.g. a report deadline) or an unexpected error: never leave a half-open probe
+            # outstanding, or every later call to the host would be rejected
+            breaker.release_probe()
+            raise
+        else:
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+            if attempt + 1 >= attempts:
+                return response
+        breaker.stats["retries"] += 1
+        await asyncio.sleep(backoff_delay(attempt))
+
+def get_breaker_states():
+    """Circuit breaker state and counters per upstream host"""
+    return {host: breaker.snapshot() for host, breaker in _breakers.items()}
@@ -0,0 +1,50 @@
+import numpy as np
+from models.spotify_models import AudioFeatures
+
+# Column order of the feature matrix (the AudioFeatures fields)
+FEATURE_NAMES = list(AudioFeatures.model_fields)
+
+# Valence/energy quadrants: high/high, low/high, high/low, low/low
+MOODS = ["happy", "intense", "calm", "melancholic"]
+
+def features_matrix(features: list):
+    """Stack audio-feature objects into an (n, len(FEATURE_NAMES)) float matrix; missing tracks are NaN rows"""
+    empty = {}
+    rows = [[(feature or empty).get(name) for name in FEATURE_NAMES] for feature in features]
+    return np.array(rows, dtype=float).reshape(len(features), len(FEATURE_NAMES))  # None becomes NaN
+
+def average_features(matrix: np.ndarray):
+    """Column means over the tracks that have features (zeros when none do)"""
+    present = ~np.isnan(matrix).all(axis=1)
+    if not present.any():
+        return AudioFeatures(**{name: 0.0 for name in FEATURE_NAMES})
+    means = np.nanmean(matrix[present], axis=0)
+    return AudioFeatures(**{name: float(value) for name, value in zip(FEATURE_NAMES, means)})
+
+def classify_moods(matrix: np.ndarray):
+    """Label every track from its valence/energy quadrant in one vectorized pass"""
+    valence = matrix[:, FEATURE_NAMES.index("valence")]
+    energy = matrix[:, FEATURE_NAMES.index("energy")]
+    conditions = [
+        (valence >= 0.5) & (energy >= 0.5),
+        (valence < 0.5) & (energy >= 0.5),
+        (valence >= 0.5) & (energy < 0.5),
+    ]
+    moods = np.select(conditions, MOODS[:3], default=MOODS[3])
+    return moods[~np.isnan(valence) & ~np.isnan(energy)]
+
+def dominant_mood(matrix: np.ndarray):
+    """Most common track mood ("unknown" without features)"""
+    moods = classify_moods(matrix)
+    if not moods.size:
+        return "unknown"
+    labels, counts = np.unique(moods, return_counts=True)
+    return str(labels[np.argmax(counts)])
+
+def top_counts(values: list, limit: int):
+    """(value, count) pairs for the most frequent values, most frequent first"""
+    if not values:
+        return []
+    labels, counts = np.unique(np.asarray(values, dtype=object).astype(str), return_counts=True)
+    order = np.lexsort((labels, -counts))[:limit]
+    return [(str(labels[index]), int(counts[index])) for index in order]
@@ -1,38 +1,55 @@
 import os
-import requests
+import logging
+import json
+import asyncio
+import hashlib
+import numpy as np
 from fastapi import Request, HTTPException
+from datetime import datetime, timedelta
+from services.token_service import get_token_from_session, save_token_to_session, coordinate_token_refresh
+from services.http_client import http_get
+from services.oauth_providers import get_oauth_provider
+from services.metrics import instrumented
+from services.cache_service import cache_get, cache_set, cache_delete, make_cache_key
+from services.spotify_analysis import FEATURE_NAMES, average_features, dominant_mood, features_matrix, top_counts
+from models.spotify_models import MusicTasteAnalysis, PlaylistAnalysis
 from dotenv import load_dotenv
 
 load_dotenv()
 
-SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
-SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
-SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI", "https://f0k0kw0go4g0ko4o0gggoscw.vps.boomlive.in/auth/callback/spotify")
+logger = logging.getLogger(__name__)
+
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+SPOTIFY_FOLLOWING_PAGE_SIZE = 50  # API maximum for /me/following
+SPOTIFY_ARTISTS_CACHE_TTL = int(os.getenv("SPOTIFY_ARTISTS_CACHE_TTL", "300"))  # Followed artists change rarely
+SPOTIFY_FEATURE_BATCH_SIZE = 100  # API maximum IDs per /audio-features call
+SPOTIFY_BATCH_CONCURRENCY = int(os.getenv("SPOTIFY_BATCH_CONCURRENCY", "4"))  # Batched Spotify calls in flight per request
+SPOTIFY_TOP_GENRES = 10
+SPOTIFY_TOP_ARTISTS = 10
+SPOTIFY_PLAYLIST_PAGE_SIZE = 100  # API maximum items per playlist page
+SPOTIFY_PLAYLIST_MAX_TRACKS = int(os.getenv("SPOTIFY_PLAYLIST_MAX_TRACKS", "10000"))
+SPOTIFY_PLAYLIST_CACHE_TTL = int(os.getenv("SPOTIFY_PLAYLIST_CACHE_TTL", str(7 * 86400)))  # Keyed on snapshot_id
+SPOTIFY_TIME_RANGES = {"short_term", "medium_term", "long_term"}
+
+def spotify_user_cache_key(namespace: str, token_info: dict, **parts):
+    """Per-user cache key, scoped by a hash of the user's refresh token"""
+    user_secret = token_info.get("refresh_token") or token_info.get("access_token") or ""
+    user_scope = hashlib.sha256(user_secret.encode()).hexdigest()[:32]
+    return make_cache_key(namespace, user=user_scope, **parts)
 
 def get_spotify_auth_url():
     """Generate Spotify OAuth authorization URL"""
-    scope = "user-follow-read user-read-email user-top-read"
-    return (
-        f"https://accounts.spotify.com/authorize?client_id={SPOTIFY_CLIENT_ID}&response_type=code"
-        f"&redirect_uri={SPOTIFY_REDIRECT_URI}&scope={scope}"
-    )
-import os
-import requests
-from fastapi import Request, HTTPException
-from datetime import datetime, timedelta
-from services.token_service import get_token_from_session, save_token_to_session
+    return get_oauth_provider("spotify").authorization_url
 
-SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
-SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
-
-def refresh_spotify_token_if_needed(request: Request):
+@instrumented("spotify.token_refresh")
+async def refresh_spotify_token_if_needed(request: Request):
     """Check if Spotify token needs refresh and refresh it if necessary"""
-    token_info = get_token_from_session(request, key="spotify_token_info")
-    print("Existing Spotify Token Info:", token_info)  # Debugging
+    token_info = await get_token_from_session(request, key="spotify_token_info")
+    logger.debug("Existing Spotify token info: %s", token_info)
 
     # Ensure token has expiry info
     if not token_info or "expires_in" not in token_info:
-        print("Missing expiry information!")
+        logger.warning("Spotify token has no expiry information")
         raise HTTPException(status_code=401, detail="No valid Spotify token found")
 
     # Calculate expiry time dynamically
@@ -40,74 +57,230 @@ def refresh_spotify_token_if_needed(request: Request):
     expiry_time = float(token_info.get("expires_at", current_time + token_info["expires_in"]))
 
     if current_time + 300 >= expiry_time:  # Refresh if expiring in next 5 minutes
-        print("Spotify Token is expired or expiring soon, refreshing...")
+        logger.info("Spotify token is expired or expiring soon, refreshing")
 
         refresh_token = token_info.get("refresh_token")
         if not refresh_token:
-            print("Missing refresh token!")
+            logger.warning("Spotify token has no refresh token")
             raise HTTPException(status_code=401, detail="No refresh token available")
 
-        # Prepare refresh request
-        token_url = "https://accounts.spotify.com/api/token"
-        payload = {
-            "grant_type": "refresh_token",
-            "refresh_token": refresh_token,
-            "client_id": SPOTIFY_CLIENT_ID,
-            "client_secret": SPOTIFY_CLIENT_SECRET
-        }
+        async def refresh():
+            return await get_oauth_provider("spotify").refresh(refresh_token)
 
-        response = requests.post(token_url, data=payload)
-        if response.status_code != 200:
-            print("Spotify OAuth refresh error:", response.json())  # Debugging
-            raise HTTPException(status_code=401, detail=f"Failed to refresh Spotify token: {response.json()}")
+        # Concurrent requests holding the same refresh token share a single refresh
+        new_token_info = await coordinate_token_refresh("spotify", refresh_token, refresh)
 
-        # Update token info
-        new_token_info = response.json()
+        # Update token info (Spotify may rotate the refresh token)
         token_info.update({
             "access_token": new_token_info["access_token"],
-            "expires_at": current_time + new_token_info["expires_in"]  # Compute expiry time dynamically
+            "expires_at": new_token_info["expires_at"],
+            "refresh_token": new_token_info.get("refresh_token") or refresh_token
         })
 
         # Save updated token info to session
-        save_token_to_session(request, token_info, key="spotify_token_info")
-        print("Spotify Token refreshed successfully:", token_info)
+        await save_token_to_session(request, token_info, key="spotify_token_info")
+        logger.info("Spotify token refreshed, expires at %s", token_info["expires_at"])
 
     else:
-        print("Spotify Token is still valid!")
+        logger.debug("Spotify token is still valid")
 
     return token_info
 
 
 
 
-def exchange_spotify_token(request: Request, code: str):
+async def exchange_spotify_token(request: Request, code: str):
     """Exchange authorization code for access token"""
-    token_url = "https://accounts.spotify.com/api/token"
-    data = {
-        "grant_type": "authorization_code",
-        "code": code,
-        "redirect_uri": SPOTIFY_REDIRECT_URI,
-        "client_id": SPOTIFY_CLIENT_ID,
-        "client_secret": SPOTIFY_CLIENT_SECRET
-    }
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    response = requests.post(token_url, data=data, headers=headers)
-    
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail="Failed     to exchange token")
-    
-    token_info = response.json()
-    request.session["spotify_token_info"] = token_info  # Save token in session
+    provider = get_oauth_provider("spotify")
+    token_info = await provider.exchange_code(code)
+    await save_token_to_session(request, token_info, key=provider.token_key)  # Save token in session
     return token_info
 
-def get_user_artists(request: Request):
-    """Fetch followed artists for authenticated user"""
-    token_info = request.session.get("spotify_token_info")
-    if not token_info:
-        raise HTTPException(status_code=401, detail="User not authenticated")
-    
-    access_token = token_info["access_token"]
+async def get_spotify_user_token(request: Request):
+    """Return a valid Spotify token for the session, mapping a missing token to 401"""
+    try:
+        return await refresh_spotify_token_if_needed(request)
+    except HTTPException as e:
+        raise HTTPException(status_code=401, detail=f"User not authenticated: {e.detail}")
+
+async def iter_followed_artist_pages(access_token: str):
+    """Yield /me/following pages, following the cursors.after chain until it runs out"""
     headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get("https://api.spotify.com/v1/me/following?type=artist", headers=headers)
+    url = f"{SPOTIFY_API_URL}/me/following?type=artist&limit={SPOTIFY_FOLLOWING_PAGE_SIZE}"
+
+    while url:
+        response = await http_get(url, headers=headers)
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail=f"Failed to retrieve artists: {response.text}")
+        page = response.json().get("artists", {})
+        yield page
+        url = page.get("next") if (page.get("cursors") or {}).get("after") else None
+
+@instrumented("spotify.followed_artists")
+async def get_user_artists(request: Request, bypass_cache: bool = False, invalidate_cache: bool = False):
+    """Fetch every followed artist for the authenticated user (assembled list cached per user)"""
+    token_info = await get_spotify_user_token(request)
+    cache_key = spotify_user_cache_key("spotify_artists", token_info)
+
+    if invalidate_cache:
+        await cache_delete(cache_key)
+    elif not bypass_cache:
+        cached = await cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+    items = []
+    total = 0
+    async for page in iter_followed_artist_pages(token_info["access_token"]):
+        items.extend(page.get("items", []))
+        total = page.get("total", total)
+
+    # Same shape as a single /me/following response, with the whole cursor chain folded in
+    artists = {"artists": {"items": items, "total": total, "limit": len(items), "next": None, "cursors": {"after": None}}}
+    if not bypass_cache:
+        await cache_set(cache_key, artists, SPOTIFY_ARTISTS_CACHE_TTL)
+    return artists
+
+async def stream_user_artists(request: Request, bypass_cache: bool = False, invalidate_cache: bool = False):
+    """Stream followed artists as NDJSON (one artist per line) while the cursor chain is walked"""
+    token_info = await get_spotify_user_token(request)
+    cache_key = spotify_user_cache_key("spotify_artists", token_info)
+
+    cached = None if bypass_cache or invalidate_cache else await cache_get(cache_key)
+    if cached is not None:
+        for artist in cached["artists"]["items"]:
+            yield json.dumps(artist) + "\n"
+        return
+
+    items = []
+    total = 0
+    async for page in iter_followed_artist_pages(token_info["access_token"]):
+        total = page.get("total", total)
+        for artist in page.get("items", []):
+            items.append(artist)
+            yield json.dumps(artist) + "\n"
+
+    if not bypass_cache:
+        artists = {"artists": {"items": items, "total": total, "limit": len(items), "next": None, "cursors": {"after": None}}}
+        await cache_set(cache_key, artists, SPOTIFY_ARTISTS_CACHE_TTL)
+
+async def fetch_top_items(access_token: str, kind: str, time_range: str = "medium_term", limit: int = 50):
+    """Fetch the user's top artists or tracks for a time range"""
+    response = await http_get(
+        f"{SPOTIFY_API_URL}/me/top/{kind}",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"time_range": time_range, "limit": limit}
+    )
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail=f"Failed to retrieve top {kind}: {response.text}")
+    return response.json().get("items", [])
 
-    return response.json() if response.status_code == 200 else None
+@instrumented("spotify.audio_features")
+async def fetch_audio_features(access_token: str, track_ids: list):
+    """
+    Fetch audio features in SPOTIFY_FEATURE_BATCH_SIZE-ID batches, sent concurrently (bounded by
+    SPOTIFY_BATCH_CONCURRENCY); returns one feature dict (or None) per track ID, in order
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    semaphore = asyncio.Semaphore(SPOTIFY_BATCH_CONCURRENCY)
+
+    async def fetch_batch(batch_ids):
+        async with semaphore:
+            response = await http_get(f"{SPOTIFY_API_URL}/audio-features", headers=headers, params={"ids": ",".join(batch_ids)})
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail=f"Failed to retrieve audio features: {response.text}")
+        return response.json().get("audio_features") or [None] * len(batch_ids)
+
+    batches = [track_ids[index:index + SPOTIFY_FEATURE_BATCH_SIZE]
+               for index in range(0, len(track_ids), SPOTIFY_FEATURE_BATCH_SIZE)]
+    results = await asyncio.gather(*(fetch_batch(batch_ids) for batch_ids in batches))
+    return [feature for batch in results for feature in batch]
+
+@instrumented("spotify.taste_analysis")
+async def analyze_music_taste(request: Request, time_range: str = "medium_term"):
+    """Build a MusicTasteAnalysis from the user's top tracks and artists"""
+    token_info = await get_spotify_user_token(request)
+    access_token = token_info["access_token"]
+
+    top_tracks, top_artists = await asyncio.gather(
+        fetch_top_items(access_token, "tracks", time_range),
+        fetch_top_items(access_token, "artists", time_range)
+    )
+    features = await fetch_audio_features(access_token, [track["id"] for track in top_tracks if track.get("id")])
+    matrix = features_matrix(features)
+
+    return MusicTasteAnalysis(
+        avg_audio_features=average_features(matrix),
+        top_genres=top_counts([genre for artist in top_artists for genre in artist.get("genres", [])], SPOTIFY_TOP_GENRES),
+        mood=dominant_mood(matrix),
+        most_played_artist=top_artists[0]["name"] if top_artists else None,
+        most_played_track=top_tracks[0]["name"] if top_tracks else None
+    )
+
+async def fetch_playlist_page(access_token: str, playlist_id: str, offset: int):
+    """Fetch one page of playlist items, trimmed to the fields the analysis needs"""
+    response = await http_get(
+        f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"offset": offset, "limit": SPOTIFY_PLAYLIST_PAGE_SIZE, "fields": "items(track(id,duration_ms,artists(name)))"}
+    )
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail=f"Failed to retrieve playlist tracks: {response.text}")
+    return response.json().get("items", [])
+
+@instrumented("spotify.playlist_analysis")
+async def analyze_playlist(request: Request, playlist_id: str, bypass_cache: bool = False):
+    """
+    Build a PlaylistAnalysis for up to SPOTIFY_PLAYLIST_MAX_TRACKS tracks. Pages (and their audio-feature
+    batches) are fetched in parallel and reduced straight into preallocated arrays, so only compact
+    per-track values are kept; the result is cached per playlist snapshot_id.
+    """
+    token_info = await get_spotify_user_token(request)
+    access_token = token_info["access_token"]
+
+    response = await http_get(
+        f"{SPOTIFY_API_URL}/playlists/{playlist_id}",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"fields": "name,snapshot_id,tracks.total"}
+    )
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=f"Failed to retrieve playlist: {response.text}")
+    playlist = response.json()
+
+    # A playlist's snapshot_id changes on every edit, so an unchanged playlist is never re-analyzed
+    cache_key = make_cache_key("spotify_playlist", playlist_id=playlist_id, snapshot_id=playlist.get("snapshot_id"))
+    if not bypass_cache:
+        cached = await cache_get(cache_key)
+        if cached is not None:
+            return PlaylistAnalysis(**cached)
+
+    total = min((playlist.get("tracks") or {}).get("total", 0), SPOTIFY_PLAYLIST_MAX_TRACKS)
+    matrix = np.full((total, len(FEATURE_NAMES)), np.nan)
+    durations = np.zeros(total)
+    artist_names = []
+    semaphore = asyncio.Semaphore(SPOTIFY_BATCH_CONCURRENCY)
+
+    async def process_page(offset):
+        async with semaphore:
+            items = (await fetch_playlist_page(access_token, playlist_id, offset))[:total - offset]
+            tracks = [item.get("track") or {} for item in items]
+            track_ids = [track.get("id") for track in tracks]
+            known_ids = [track_id for track_id in track_ids if track_id]
+            features = iter(await fetch_audio_features(access_token, known_ids) if known_ids else [])
+        matrix[offset:offset + len(tracks)] = features_matrix([next(features) if track_id else None for track_id in track_ids])
+        durations[offset:offset + len(tracks)] = [track.get("duration_ms") or 0 for track in tracks]
+        artist_names.extend(artist["name"] for track in tracks for artist in track.get("artists") or [] if artist.get("name"))
+
+    await asyncio.gather(*(process_page(offset) for offset in range(0, total, SPOTIFY_PLAYLIST_PAGE_SIZE)))
+
+    analysis = PlaylistAnalysis(
+        playlist_name=playlist.get("name") or "",
+        total_tracks=total,
+        total_duration_min=round(float(durations.sum()) / 60000, 2),
+        avg_audio_features=average_features(matrix),
+        top_artists=top_counts(artist_names, SPOTIFY_TOP_ARTISTS),
+        mood=dominant_mood(matrix)
+    )
+    if not bypass_cache:
+        await cache_set(cache_key, analysis.model_dump(), SPOTIFY_PLAYLIST_CACHE_TTL)
+    return analysis
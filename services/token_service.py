@@ -1,53 +1,74 @@
 
 from fastapi import Request, HTTPException
 import os
-from google_auth_oauthlib.flow import Flow
+import logging
+import time
+import asyncio
+import hashlib
+import secrets
 from google.oauth2.credentials import Credentials
 import json
+from services.token_store import LAST_ACTIVE_KEY, load_session_tokens, save_session_tokens, delete_session_tokens
+
+logger = logging.getLogger(__name__)
 
 # Session keys
 GOOGLE_TOKEN_KEY = "google_token_info"
+SESSION_ID_KEY = "sid"
+LEGACY_TOKEN_KEYS = ["google_token_info", "spotify_token_info", "facebook_token_info", "token_info"]
+# Scope flag set on requests built by the prefetch scheduler rather than sent by a user
+BACKGROUND_REQUEST_KEY = "background"
+# Token-store IDs holding a provider account's latest credentials, independent of browser sessions
+ACCOUNT_SESSION_PREFIX = "account:"
 
-def create_google_oauth():
-    """Create and configure Google OAuth flow"""
-    client_id = os.getenv("GOOGLE_CLIENT_ID")
-    client_secret = os.getenv("GOOGLE_CLIENT_SECRET")
-    redirect_uri = os.getenv("REDIRECT_URI", "https://f0k0kw0go4g0ko4o0gggoscw.vps.boomlive.in/auth/callback/google")
-    
-    # Using client_secrets dict instead of file
-    client_config = {
-        "web": {
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "redirect_uris": [redirect_uri]
-        }
-    }
-    
-    # Create flow instance
-    flow = Flow.from_client_config(
-        client_config,
-        scopes=[
-            "https://www.googleapis.com/auth/analytics.readonly",
-            "https://www.googleapis.com/auth/analytics",
-            "https://www.googleapis.com/auth/analytics.edit",
-            "https://www.googleapis.com/auth/analytics.manage.users",  # Manage users (if needed)
-            "https://www.googleapis.com/auth/analytics.manage.users.readonly",  # Read user access levels
-            "https://www.googleapis.com/auth/analytics.provision",  # Admin access to GA accounts
-            "https://www.googleapis.com/auth/youtube",
-            "https://www.googleapis.com/auth/yt-analytics-monetary.readonly",
-            "https://www.googleapis.com/auth/youtube.readonly",
-            "https://www.googleapis.com/auth/yt-analytics.readonly",
-            "https://www.googleapis.com/auth/youtube.force-ssl",
-            "https://www.googleapis.com/auth/youtubepartner",
-            "https://www.googleapis.com/auth/youtube.channel-memberships.creator"
-        ],
-        redirect_uri=redirect_uri
-    )
-    return flow
-
-def save_token_to_session(request: Request, token_info, key=GOOGLE_TOKEN_KEY):
+# Last activity is written back at most this often per session
+SESSION_TOUCH_INTERVAL = int(os.getenv("SESSION_TOUCH_INTERVAL", "300"))
+
+# A finished refresh is handed to late callers still holding the old token for this many seconds
+REFRESH_RESULT_TTL = int(os.getenv("REFRESH_RESULT_TTL", "60"))
+
+# Single-flight refresh state, keyed by provider and refresh-token hash
+_refreshes_in_flight = {}
+_recent_refreshes = {}
+_refresh_stats = {"refreshes": 0, "coalesced": 0, "failures": 0}
+
+def is_background_request(request: Request):
+    """Whether the request was built by the prefetch scheduler rather than sent by the user"""
+    return bool(request.scope.get(BACKGROUND_REQUEST_KEY))
+
+def account_session_id(key: str, account_id: str):
+    """Token-store ID for an account's credentials (cookie session IDs never contain a colon)"""
+    return f"{ACCOUNT_SESSION_PREFIX}{key}:{hashlib.sha256(account_id.encode()).hexdigest()[:32]}"
+
+def is_account_session(sid: str):
+    return sid.startswith(ACCOUNT_SESSION_PREFIX)
+
+async def _store_token(sid: str, key: str, token_info: dict, background: bool):
+    tokens = await load_session_tokens(sid)
+    tokens[key] = token_info
+    # Background refreshes keep the entry's expiry, so sessions and accounts nobody uses still run out
+    if not background:
+        tokens[LAST_ACTIVE_KEY] = time.time()
+    await save_session_tokens(sid, tokens, keep_expiry=background)
+
+async def get_session_id(request: Request, create: bool = False):
+    """
+    Return the opaque session ID from the cookie, creating one if requested.
+    Tokens left in the cookie by older versions are moved into the token store.
+    """
+    sid = request.session.get(SESSION_ID_KEY)
+    legacy_keys = [key for key in LEGACY_TOKEN_KEYS if key in request.session]
+    if not sid and (create or legacy_keys):
+        sid = secrets.token_urlsafe(32)
+        request.session[SESSION_ID_KEY] = sid
+    if legacy_keys:
+        tokens = await load_session_tokens(sid)
+        for key in legacy_keys:
+            tokens.setdefault(key, request.session.pop(key))
+        await save_session_tokens(sid, tokens)
+    return sid
+
+async def save_token_to_session(request: Request, token_info, key=GOOGLE_TOKEN_KEY):
     """Save token information to session"""
     # Convert to dictionary if it's a string
     if isinstance(token_info, str):
@@ -62,21 +83,92 @@ def save_token_to_session(request: Request, token_info, key=GOOGLE_TOKEN_KEY):
             "expires_at": token_info.expiry.timestamp() if token_info.expiry else None
         }
     
-    # Store in session
-    request.session[key] = token_info
-    print(f"Token saved to session with key: {key}")
+    # Store server-side; the session cookie only carries the opaque session ID
+    sid = await get_session_id(request, create=True)
+    background = is_background_request(request)
+    await _store_token(sid, key, token_info, background)
+    # Tokens that know their account are also kept per account, where the prefetcher finds them
+    account_id = token_info.get("account_id") if isinstance(token_info, dict) else None
+    if account_id and account_session_id(key, account_id) != sid:
+        await _store_token(account_session_id(key, account_id), key, token_info, background)
+    logger.debug("Token saved to session with key: %s", key)
 
-def get_token_from_session(request: Request, key=GOOGLE_TOKEN_KEY):
+async def get_token_from_session(request: Request, key=GOOGLE_TOKEN_KEY):
     """Get token information from session"""
-    token_info = request.session.get(key)
+    sid = await get_session_id(request)
+    tokens = await load_session_tokens(sid) if sid else {}
+    token_info = tokens.get(key)
     if not token_info:
         raise HTTPException(status_code=401, detail=f"No {key.replace('_', ' ')} found. Please authenticate first.")
+    if not is_background_request(request) and tokens.get(LAST_ACTIVE_KEY, 0) + SESSION_TOUCH_INTERVAL <= time.time():
+        tokens[LAST_ACTIVE_KEY] = time.time()
+        await save_session_tokens(sid, tokens)
     return token_info
 
-def is_authenticated(request: Request, key=GOOGLE_TOKEN_KEY):
+async def has_token(request: Request, key=GOOGLE_TOKEN_KEY):
+    """Check whether a token is stored for the session under key"""
+    sid = await get_session_id(request)
+    return bool(sid and (await load_session_tokens(sid)).get(key))
+
+async def delete_token_from_session(request: Request, key=GOOGLE_TOKEN_KEY):
+    """Remove a stored token from the session"""
+    sid = await get_session_id(request)
+    if not sid:
+        return
+    tokens = await load_session_tokens(sid)
+    token_info = tokens.pop(key, None)
+    if token_info is not None:
+        await save_session_tokens(sid, tokens)
+        # Logging out also stops background work for the account
+        if isinstance(token_info, dict) and token_info.get("account_id"):
+            await delete_session_tokens(account_session_id(key, token_info["account_id"]))
+
+async def is_authenticated(request: Request, key=GOOGLE_TOKEN_KEY):
     """Check if user is authenticated"""
     try:
-        get_token_from_session(request, key)
+        await get_token_from_session(request, key)
         return True
     except HTTPException:
-        return False
\ No newline at end of file
+        return False
+
+async def _run_refresh(key, refresh):
+    try:
+        result = await refresh()
+    except Exception:
+        _refresh_stats["failures"] += 1
+        raise
+    finally:
+        _refreshes_in_flight.pop(key, None)
+
+    now = time.time()
+    for stale_key in [k for k, (finished_at, _) in _recent_refreshes.items() if finished_at + REFRESH_RESULT_TTL <= now]:
+        _recent_refreshes.pop(stale_key, None)
+    _recent_refreshes[key] = (now, result)
+    return result
+
+async def coordinate_token_refresh(provider: str, refresh_token: str, refresh):
+    """
+    Run refresh() at most once per refresh token: concurrent callers await the in-flight refresh,
+    and callers arriving shortly after it finished reuse its result instead of hitting the provider again
+    """
+    key = f"{provider}:{hashlib.sha256(refresh_token.encode()).hexdigest()}"
+
+    recent = _recent_refreshes.get(key)
+    if recent and recent[0] + REFRESH_RESULT_TTL > time.time():
+        _refresh_stats["coalesced"] += 1
+        return dict(recent[1])
+
+    task = _refreshes_in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_run_refresh(key, refresh))
+        _refreshes_in_flight[key] = task
+        _refresh_stats["refreshes"] += 1
+    else:
+        _refresh_stats["coalesced"] += 1
+
+    # Shield so a cancelled caller does not abort the refresh other callers are waiting on
+    return dict(await asyncio.shield(task))
+
+def get_refresh_stats():
+    """Counts of provider refreshes performed, coalesced and failed"""
+    return {**_refresh_stats, "in_flight": len(_refreshes_in_flight)}
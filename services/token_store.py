@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import copy
+import asyncio
+import sqlite3
+import threading
+from cachetools import TTLCache
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+load_dotenv()
+
+# redis://host:port/db, sqlite:///path/to/file.db or memory://
+TOKEN_STORE_URL = os.getenv("TOKEN_STORE_URL", "sqlite:///token_store.db")
+TOKEN_STORE_TTL = int(os.getenv("TOKEN_STORE_TTL", str(30 * 24 * 3600)))  # Keep stored tokens for 30 days
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "30"))  # In-process read-through cache lifetime (not used with Redis)
+SESSION_IDLE_TIMEOUT = int(os.getenv("SESSION_IDLE_TIMEOUT", "3600"))  # Session cookie max_age: idle sessions are unreachable after it
+
+# Stored alongside the token dicts: when the user last made a request with the session
+LAST_ACTIVE_KEY = "last_active_at"
+
+class MemoryTokenBackend:
+    """Token sessions kept in process memory (single worker, lost on restart)"""
+    shared = False
+
+    def __init__(self):
+        self._sessions = {}
+
+    async def load(self, sid: str):
+        entry = self._sessions.get(sid)
+        if entry is None or entry[0] <= time.time():
+            self._sessions.pop(sid, None)
+            return None
+        return json.loads(entry[1])
+
+    async def save(self, sid: str, tokens: dict, ttl: int, keep_expiry: bool = False):
+        if keep_expiry:
+            entry = self._sessions.get(sid)
+            if entry is not None and entry[0] > time.time():
+                self._sessions[sid] = (entry[0], json.dumps(tokens))
+            return
+        self._sessions[sid] = (time.time() + ttl, json.dumps(tokens))
+
+    async def delete(self, sid: str):
+        self._sessions.pop(sid, None)
+
+    async def iter_sessions(self):
+        for sid in list(self._sessions):
+            tokens = await self.load(sid)
+            if tokens is not None:
+                yield sid, tokens
+
+class SQLiteTokenBackend:
+    """Token sessions persisted to a local SQLite file; queries run in a worker thread off the event loop"""
+    shared = False
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_sessions (sid TEXT PRIMARY KEY, tokens TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _load(self, sid: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tokens FROM token_sessions WHERE sid = ? AND expires_at > ?", (sid, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, sid: str, tokens: dict, ttl: int, keep_expiry: bool):
+        with self._lock:
+            if keep_expiry:
+                self._conn.execute(
+                    "UPDATE token_sessions SET tokens = ? WHERE sid = ? AND expires_at > ?", (json.dumps(tokens), sid, time.time())
+                )
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO token_sessions (sid, tokens, expires_at) VALUES (?, ?, ?)",
+                (sid, json.dumps(tokens), time.time() + ttl)
+            )
+
+    def _delete(self, sid: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM token_sessions WHERE sid = ?", (sid,))
+
+    def _list_sessions(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM token_sessions WHERE expires_at <= ?", (time.time(),))
+            return self._conn.execute("SELECT sid, tokens FROM token_sessions").fetchall()
+
+    async def load(self, sid: str):
+        return await asyncio.to_thread(self._load, sid)
+
+    async def save(self, sid: str, tokens: dict, ttl: int, keep_expiry: bool = False):
+        await asyncio.to_thread(self._save, sid, tokens, ttl, keep_expiry)
+
+    async def delete(self, sid: str):
+        await asyncio.to_thread(self._delete, sid)
+
+    async def iter_sessions(self):
+        for sid, tokens in await asyncio.to_thread(self._list_sessions):
+            yield sid, json.loads(tokens)
+
+class RedisTokenBackend:
+    """Token sessions shared between workers through Redis (read directly, so every worker sees saves and logouts)"""
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "analytics:token_session:"):
+        self._client = aioredis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self._prefix = prefix
+
+    async def load(self, sid: str):
+        payload = await self._client.get(self._prefix + sid)
+        return json.loads(payload) if payload else None
+
+    async def save(self, sid: str, tokens: dict, ttl: int, keep_expiry: bool = False):
+        if keep_expiry:
+            await self._client.set(self._prefix + sid, json.dumps(tokens), keepttl=True, xx=True)
+            return
+        await self._client.set(self._prefix + sid, json.dumps(tokens), ex=ttl)
+
+    async def delete(self, sid: str):
+        await self._client.delete(self._prefix + sid)
+
+    async def iter_sessions(self):
+        async for key in self._client.scan_iter(match=self._prefix + "*"):
+            sid = key.decode()[len(self._prefix):]
+            tokens = await self.load(sid)
+            if tokens is not None:
+                yield sid, tokens
+
+def create_token_backend(url: str = TOKEN_STORE_URL):
+    """Build the token store backend named by TOKEN_STORE_URL"""
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisTokenBackend(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteTokenBackend(url[len("sqlite:///"):])
+    if url.startswith("memory://"):
+        return MemoryTokenBackend()
+    raise ValueError(f"Unsupported TOKEN_STORE_URL: {url}")
+
+_backend = None
+_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
+def get_token_backend():
+    global _backend
+    if _backend is None:
+        _backend = create_token_backend()
+    return _backend
+
+async def load_session_tokens(sid: str):
+    """
+    Return the token dicts stored for a session ID. Local backends are read through the in-process
+    cache; Redis is shared between workers and always read directly.
+    """
+    backend = get_token_backend()
+    tokens = None if backend.shared else _cache.get(sid)
+    if tokens is None:
+        tokens = await backend.load(sid) or {}
+        if not backend.shared:
+            _cache[sid] = tokens
+    return copy.deepcopy(tokens)
+
+async def save_session_tokens(sid: str, tokens: dict, keep_expiry: bool = False):
+    """
+    Write a session's token dicts to the backend and drop the cached copy. Each write extends the
+    session to TOKEN_STORE_TTL, except with keep_expiry (background writes), which keeps the current
+    expiry and never recreates a session that is already gone.
+    """
+    # Dropped again after the write, in case a concurrent read cached the old value meanwhile
+    _cache.pop(sid, None)
+    if set(tokens) - {LAST_ACTIVE_KEY}:
+        await get_token_backend().save(sid, tokens, TOKEN_STORE_TTL, keep_expiry)
+    else:
+        await get_token_backend().delete(sid)
+    _cache.pop(sid, None)
+
+async def delete_session_tokens(sid: str):
+    """Remove every token stored for a session ID"""
+    _cache.pop(sid, None)
+    await get_token_backend().delete(sid)
+    _cache.pop(sid, None)
+
+def iter_stored_sessions():
+    """Async iterator of (session ID, token dicts) for every stored session"""
+    return get_token_backend().iter_sessions()
@@ -0,0 +1,19 @@
+from datetime import date
+from services import fact_store
+from services.fact_store import missing_spans
+
+def test_missing_spans_merges_contiguous_gaps():
+    stored = {"2024-01-02", "2024-01-03", "2024-01-06"}
+    assert missing_spans(date(2024, 1, 1), date(2024, 1, 8), stored) == [
+        (date(2024, 1, 1), date(2024, 1, 1)),
+        (date(2024, 1, 4), date(2024, 1, 5)),
+        (date(2024, 1, 7), date(2024, 1, 8)),
+    ]
+
+def test_missing_spans_empty_when_everything_is_stored():
+    assert missing_spans(date(2024, 1, 1), date(2024, 1, 2), {"2024-01-01", "2024-01-02"}) == []
+
+def test_too_many_gaps_collapse_into_one_span(monkeypatch):
+    monkeypatch.setattr(fact_store, "FACT_MAX_SPANS", 2)
+    stored = {"2024-01-02", "2024-01-04"}
+    assert missing_spans(date(2024, 1, 1), date(2024, 1, 5), stored) == [(date(2024, 1, 1), date(2024, 1, 5))]
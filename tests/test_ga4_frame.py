@@ -0,0 +1,64 @@
+import pytest
+from services.ga4_frame import OTHER_BUCKET, aggregate_ga4_report, parse_aggregation
+
+def report(dimensions, metrics, rows):
+    return {
+        "dimensionHeaders": [{"name": name} for name in dimensions],
+        "metricHeaders": [{"name": name, "type": metric_type} for name, metric_type in metrics],
+        "rows": [
+            {"dimensionValues": [{"value": value} for value in key], "metricValues": [{"value": value} for value in values]}
+            for key, values in rows
+        ]
+    }
+
+SESSIONS = ("sessions", "TYPE_INTEGER")
+BOUNCE_RATE = ("bounceRate", "TYPE_FLOAT")
+ACTIVE_USERS = ("activeUsers", "TYPE_INTEGER")
+
+def test_no_parameters_means_no_aggregation():
+    assert parse_aggregation() is None
+
+def test_parse_rejects_unknown_methods_and_periods():
+    with pytest.raises(ValueError):
+        parse_aggregation(metric_agg="sessions:median")
+    with pytest.raises(ValueError):
+        parse_aggregation(resample="year")
+    with pytest.raises(ValueError):
+        parse_aggregation(top_n=-1)
+
+def test_group_by_sums_counts_and_weights_ratios():
+    result = aggregate_ga4_report(report(["country", "city"], [SESSIONS, BOUNCE_RATE], [
+        (("IN", "Mumbai"), ["100", "0.5"]),
+        (("IN", "Delhi"), ["300", "0.1"]),
+        (("US", "Austin"), ["10", "0.2"]),
+    ]), parse_aggregation(group_by="country"))
+    assert result["aggregations"] == {"sessions": "sum", "bounceRate": "weighted"}
+    assert result["columns"]["country"] == ["IN", "US"]
+    assert result["columns"]["sessions"] == [400, 10]
+    assert result["columns"]["bounceRate"] == [pytest.approx(0.2), pytest.approx(0.2)]
+
+def test_top_n_folds_the_rest_into_other_last():
+    result = aggregate_ga4_report(report(["country"], [SESSIONS], [
+        (("IN",), ["50"]), (("US",), ["80"]), (("UK",), ["5"]), (("DE",), ["7"]),
+    ]), parse_aggregation(group_by="country", top_n=2))
+    assert result["columns"]["country"] == ["US", "IN", OTHER_BUCKET]
+    assert result["columns"]["sessions"] == [80, 50, 12]
+
+def test_resample_to_weeks_starting_monday():
+    result = aggregate_ga4_report(report(["date"], [SESSIONS], [
+        (("20240101",), ["1"]), (("20240107",), ["2"]), (("20240108",), ["4"]),
+    ]), parse_aggregation(resample="week"))
+    assert result["columns"]["date"] == ["2024-01-01", "2024-01-08"]
+    assert result["columns"]["sessions"] == [3, 4]
+
+def test_user_counts_require_an_explicit_aggregation():
+    data = report(["date", "country"], [ACTIVE_USERS, SESSIONS], [
+        (("20240101", "IN"), ["10", "12"]), (("20240101", "US"), ["4", "5"]),
+    ])
+    with pytest.raises(ValueError, match="activeUsers"):
+        aggregate_ga4_report(data, parse_aggregation(group_by="date"))
+
+    result = aggregate_ga4_report(data, parse_aggregation(group_by="date", metric_agg="activeUsers:max"))
+    assert result["aggregations"]["activeUsers"] == "max"
+    assert result["columns"]["activeUsers"] == [10]
+    assert result["columns"]["sessions"] == [17]
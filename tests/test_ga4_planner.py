@@ -0,0 +1,52 @@
+from services.ga4_planner import (
+    GA4_MAX_DIMENSIONS, GA4_MAX_METRICS, join_ga4_reports, needs_ga4_plan, split_ga4_dimensions, split_ga4_metrics
+)
+
+def report(dimensions, metrics, rows):
+    return {
+        "dimensionHeaders": [{"name": name} for name in dimensions],
+        "metricHeaders": [{"name": name, "type": "TYPE_INTEGER"} for name in metrics],
+        "rows": [
+            {"dimensionValues": [{"value": value} for value in key], "metricValues": [{"value": value} for value in values]}
+            for key, values in rows
+        ],
+        "rowCount": len(rows)
+    }
+
+def test_split_metrics_into_groups_of_the_api_limit():
+    metrics = [f"m{index}" for index in range(GA4_MAX_METRICS * 2 + 3)]
+    groups = split_ga4_metrics(metrics)
+    assert [len(group) for group in groups] == [GA4_MAX_METRICS, GA4_MAX_METRICS, 3]
+    assert [metric for group in groups for metric in group] == metrics
+
+def test_split_metrics_keeps_one_empty_group():
+    assert split_ga4_metrics([]) == [[]]
+
+def test_split_dimensions_repeats_date_in_every_group():
+    dimensions = ["country", "date"] + [f"d{index}" for index in range(GA4_MAX_DIMENSIONS)]
+    groups = split_ga4_dimensions(dimensions)
+    assert len(groups) == 2
+    assert all("date" in group and len(group) <= GA4_MAX_DIMENSIONS for group in groups)
+    assert groups[0][:2] == ["country", "date"]
+    assert {name for group in groups for name in group} == set(dimensions)
+
+def test_small_field_sets_need_no_plan():
+    assert split_ga4_dimensions(["date", "country"]) == [["date", "country"]]
+    assert not needs_ga4_plan(["m"] * GA4_MAX_METRICS, ["d"] * GA4_MAX_DIMENSIONS)
+    assert needs_ga4_plan(["m"] * (GA4_MAX_METRICS + 1), ["date"])
+
+def test_join_fills_missing_rows_with_zero():
+    first = report(["date"], ["sessions"], [(("20240101",), ["5"]), (("20240102",), ["7"])])
+    second = report(["date"], ["eventCount"], [(("20240102",), ["40"]), (("20240103",), ["3"])])
+    joined = join_ga4_reports([first, second])
+    assert [header["name"] for header in joined["metricHeaders"]] == ["sessions", "eventCount"]
+    assert {row["dimensionValues"][0]["value"]: [value["value"] for value in row["metricValues"]] for row in joined["rows"]} == {
+        "20240101": ["5", "0"],
+        "20240102": ["7", "40"],
+        "20240103": ["0", "3"],
+    }
+    assert joined["rowCount"] == 3
+
+def test_join_of_one_report_is_unchanged():
+    single = report(["date"], ["sessions"], [(("20240101",), ["5"])])
+    assert join_ga4_reports([single]) is single
@@ -0,0 +1,63 @@
+from datetime import date
+import pytest
+from services.report_merge import merge_ga4_reports, merge_youtube_reports, month_chunks
+
+def ga4_report(rows):
+    return {
+        "dimensionHeaders": [{"name": "country"}],
+        "metricHeaders": [{"name": "sessions", "type": "TYPE_INTEGER"}, {"name": "bounceRate", "type": "TYPE_FLOAT"}],
+        "rows": [
+            {"dimensionValues": [{"value": country}], "metricValues": [{"value": sessions}, {"value": rate}]}
+            for country, sessions, rate in rows
+        ],
+        "rowCount": len(rows)
+    }
+
+def test_month_chunks_follow_calendar_months():
+    assert month_chunks(date(2024, 1, 15), date(2024, 3, 10)) == [
+        (date(2024, 1, 15), date(2024, 1, 31)),
+        (date(2024, 2, 1), date(2024, 2, 29)),
+        (date(2024, 3, 1), date(2024, 3, 10)),
+    ]
+
+def test_month_chunks_within_one_month():
+    assert month_chunks(date(2024, 5, 2), date(2024, 5, 3)) == [(date(2024, 5, 2), date(2024, 5, 3))]
+    assert month_chunks(date(2024, 5, 3), date(2024, 5, 2)) == []
+
+def test_ga4_merge_sums_counts_and_weights_ratios():
+    merged = merge_ga4_reports([
+        ga4_report([("IN", "100", "0.5"), ("US", "10", "0.2")]),
+        ga4_report([("IN", "300", "0.1")]),
+    ])
+    rows = {row["dimensionValues"][0]["value"]: [value["value"] for value in row["metricValues"]] for row in merged["rows"]}
+    assert rows["IN"][0] == "400"
+    assert float(rows["IN"][1]) == pytest.approx((100 * 0.5 + 300 * 0.1) / 400)
+    assert rows["US"] == ["10", "0.2"]
+    assert merged["rowCount"] == 2
+
+def test_ga4_merge_skips_empty_chunks():
+    assert merge_ga4_reports([]) == {}
+    assert merge_ga4_reports([{}, ga4_report([("IN", "1", "0")])])["rowCount"] == 1
+
+def test_youtube_merge_weights_averages_by_views_and_sorts():
+    columns = [
+        {"name": "day", "columnType": "DIMENSION"},
+        {"name": "views", "columnType": "METRIC", "dataType": "INTEGER"},
+        {"name": "averageViewDuration", "columnType": "METRIC", "dataType": "FLOAT"},
+    ]
+    merged = merge_youtube_reports([
+        {"columnHeaders": columns, "rows": [["2024-01-02", 10, 30.0], ["2024-01-01", 30, 10.0]]},
+        {"columnHeaders": columns, "rows": [["2024-01-02", 30, 50.0]]},
+    ], sort_descending=True)
+    assert merged["rows"] == [["2024-01-02", 40, pytest.approx(45.0)], ["2024-01-01", 30, 10.0]]
+
+def test_youtube_share_metrics_are_weighted_by_chunk_views():
+    columns = [
+        {"name": "ageGroup", "columnType": "DIMENSION"},
+        {"name": "viewerPercentage", "columnType": "METRIC", "dataType": "FLOAT"},
+    ]
+    merged = merge_youtube_reports([
+        {"columnHeaders": columns, "rows": [["age18-24", 50.0]]},
+        {"columnHeaders": columns, "rows": [["age18-24", 20.0]]},
+    ], chunk_weights=[100, 300])
+    assert merged["rows"] == [["age18-24", pytest.approx(27.5)]]